@@ -0,0 +1,59 @@
+"""
+Shared fixtures for the data pipeline micro-benchmarks (pytest-benchmark) and
+the regression tests that run next to them
+
+Run:
+    pytest scripts/benchmarks                                 # time only
+    pytest scripts/benchmarks --benchmark-autosave            # store a baseline
+    pytest scripts/benchmarks --benchmark-compare             # fail on regressions vs the latest baseline
+
+Baselines are stored per machine under scripts/benchmarks/baselines/.
+When comparing, a benchmark fails once it regresses past
+BENCHMARK_MAX_REGRESSION (default min:25%: its fastest round is 25%
+slower than the baseline's), unless --benchmark-compare-fail is given.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCHMARKS_DIR)
+BASELINES_DIR = os.path.join(BENCHMARKS_DIR, "baselines")
+BENCHMARK_MAX_REGRESSION = os.getenv("BENCHMARK_MAX_REGRESSION", "min:25%")
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    if not config.pluginmanager.hasplugin("benchmark"):
+        return
+    # Keep baselines next to the suite instead of in the invocation directory
+    if config.getoption("benchmark_storage") == "file://./.benchmarks":
+        config.option.benchmark_storage = f"file://{BASELINES_DIR}"
+    if config.getoption("benchmark_compare") and not config.getoption("benchmark_compare_fail"):
+        from pytest_benchmark.utils import parse_compare_fail
+
+        config.option.benchmark_compare_fail = [parse_compare_fail(BENCHMARK_MAX_REGRESSION)]
+
+
+@pytest.fixture(scope="session")
+def excel_processor():
+    pytest.importorskip("pandas")
+    from excel_processor import ExcelToSurveyProcessor
+
+    return ExcelToSurveyProcessor()
+
+
+@pytest.fixture(scope="session")
+def sync_module():
+    """scripts/sync-postgres-to-d1.py, imported by path since its name has hyphens"""
+    pytest.importorskip("psycopg2")
+    spec = importlib.util.spec_from_file_location("sync_postgres_to_d1",
+                                                  os.path.join(SCRIPTS_DIR, "sync-postgres-to-d1.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
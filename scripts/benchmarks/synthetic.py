@@ -0,0 +1,82 @@
+"""
+Deterministic synthetic inputs for the benchmarks
+"""
+
+import random
+from datetime import datetime, timedelta
+
+# Labels mixing every keyword class, so the classifiers do real work
+WORKBOOK_LABELS = [
+    "회사명", "부서명", "조사자 성명", "조사일자", "작업자세 평가 (선택)", "반복동작 점수",
+    "힘의 사용 정도", "진동 노출 여부 체크", "위험요인 평가 *", "개선방안 의견",
+    "개선 계획 설명", "근무 년수", "필수 확인 사항", "작업 시간 (required)", "기타 메모",
+]
+WORKBOOK_OPTIONS = ["양호", "보통", "위험", "매우위험", "예", "아니오", "□ 해당", "□ 비해당", 1, 2, 3, 4, 5]
+
+
+
+def make_workbook_rows(row_count, columns=8, seed=2002):
+    """Rows shaped like a survey sheet: label, description, then option cells
+
+    Roughly one row in ten is a blank or label-only separator, which the
+    extractor has to skip.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for index in range(row_count):
+        label = f"{rng.choice(WORKBOOK_LABELS)} {index}"
+        roll = rng.random()
+        if roll < 0.05:
+            rows.append((None,) * columns)
+            continue
+        if roll < 0.10:
+            rows.append((label,) + (None,) * (columns - 1))
+            continue
+        options = [rng.choice(WORKBOOK_OPTIONS) if rng.random() < 0.6 else None for _ in range(columns - 2)]
+        rows.append((label, f"{label} 항목에 대한 설명") + tuple(options))
+    return rows
+
+
+def make_survey_rows(row_count, payload_keys, seed=2024):
+    """psycopg2-style survey rows whose JSON columns carry payload_keys answers each"""
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1, 9, 0, 0)
+    rows = []
+    for index in range(1, row_count + 1):
+        responses = {
+            f"q{key}": {
+                "answer": rng.choice(["전혀 없음", "약간", "보통", "심함", "매우 심함"]),
+                "score": rng.randint(0, 10),
+                "note": "통증 부위 '어깨' 및 허리" if key % 7 == 0 else None,
+                "checked": [rng.random() < 0.5 for _ in range(4)],
+            }
+            for key in range(payload_keys)
+        }
+        created_at = started + timedelta(minutes=index)
+        rows.append({
+            "id": index,
+            "user_id": rng.randint(1, 500),
+            "form_type": "001_musculoskeletal_symptom_survey",
+            "name": f"근로자 {index}",
+            "department": rng.choice(["생산1팀", "생산2팀", "품질관리", "물류"]),
+            "position": "사원",
+            "employee_id": f"E{index:06d}",
+            "gender": rng.choice(["남", "여"]),
+            "age": rng.randint(20, 65),
+            "years_of_service": round(rng.uniform(0, 30), 1),
+            "employee_number": f"{index:08d}",
+            "work_years": rng.randint(0, 30),
+            "work_months": rng.randint(0, 11),
+            "has_symptoms": rng.random() < 0.4,
+            "status": "submitted",
+            "responses": responses,
+            "data": {"responses": responses, "meta": {"client": "web", "version": 3}},
+            "symptoms_data": {part: rng.randint(0, 3) for part in ("neck", "shoulder", "arm", "hand", "back", "leg")},
+            "company_id": rng.randint(1, 20),
+            "process_id": rng.randint(1, 50),
+            "role_id": rng.randint(1, 10),
+            "submission_date": created_at,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return rows
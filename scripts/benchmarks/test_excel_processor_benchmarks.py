@@ -0,0 +1,36 @@
+"""
+Benchmarks for ExcelToSurveyProcessor survey structure extraction
+"""
+
+import pytest
+
+from synthetic import make_workbook_rows
+
+pytest.importorskip("pytest_benchmark")
+pd = pytest.importorskip("pandas")
+
+ROW_COUNTS = [1_000, 10_000, 100_000]
+
+
+@pytest.fixture(scope="module", params=ROW_COUNTS, ids=lambda rows: f"{rows}rows")
+def workbook_rows(request):
+    return make_workbook_rows(request.param)
+
+
+@pytest.mark.benchmark(group="extract_survey_structure")
+def test_extract_survey_structure(benchmark, excel_processor, workbook_rows):
+    # pd.read_excel hands the extractor an object frame with NaN for blanks
+    df = pd.DataFrame(workbook_rows).astype(object)
+    df = df.where(df.notna(), float("nan"))
+
+    structure = benchmark(excel_processor.extract_survey_structure, df)
+
+    assert len(structure["fields"]) > 0.8 * len(workbook_rows)
+    assert {section["id"] for section in structure["sections"]} >= {"basic_info", "work_environment"}
+
+
+@pytest.mark.benchmark(group="extract_survey_structure_from_rows")
+def test_extract_survey_structure_from_rows(benchmark, excel_processor, workbook_rows):
+    structure = benchmark(excel_processor.extract_survey_structure_from_rows, workbook_rows)
+
+    assert len(structure["fields"]) > 0.8 * len(workbook_rows)
@@ -0,0 +1,72 @@
+"""
+Benchmarks for the Postgres to D1 sync's survey row encoding and push path,
+run against the in-process SQLite stand-in for D1
+"""
+
+import json
+
+import pytest
+
+from synthetic import make_survey_rows
+
+pytest.importorskip("pytest_benchmark")
+
+SURVEY_ROWS = 500
+
+# Answers per JSON column: about 2 KB, 20 KB and 80 KB of JSON per row
+PAYLOAD_KEYS = {"2kb": 25, "20kb": 250, "80kb": 1000}
+
+
+@pytest.fixture(scope="module", params=list(PAYLOAD_KEYS), ids=lambda size: f"json{size}")
+def survey_rows(request):
+    return make_survey_rows(SURVEY_ROWS, PAYLOAD_KEYS[request.param])
+
+
+@pytest.fixture
+def sqlite_d1(sync_module, tmp_path):
+    """Fresh SQLite D1 stand-in with every synced table, routed through execute_d1_command"""
+    backend = sync_module.SQLiteD1Backend(":memory:")
+    for table, columns in sync_module.TABLE_SCHEMAS.items():
+        definitions = ", ".join(
+            f"{spec[0]} INTEGER PRIMARY KEY" if spec[0] == "id" else spec[0] for spec in columns
+        )
+        backend.conn.execute(f"CREATE TABLE {table} ({definitions})")
+    sync_module.set_d1_backend(backend)
+    sync_module.set_dead_letter_log(sync_module.DeadLetterLog(str(tmp_path / "dead_letters.jsonl")))
+    yield backend
+    sync_module.set_d1_backend(None)
+    sync_module.set_dead_letter_log(None)
+    backend.close()
+
+
+@pytest.mark.benchmark(group="encode_surveys_literal")
+def test_encode_survey_rows_literal(benchmark, sync_module, survey_rows):
+    def encode():
+        return [batch for batch in sync_module.iter_insert_batches("surveys", survey_rows)]
+
+    batches = benchmark(encode)
+
+    assert sum(len(rows) for _, rows in batches) == SURVEY_ROWS
+
+
+@pytest.mark.benchmark(group="encode_surveys_bind_params")
+def test_encode_survey_rows_bind_params(benchmark, sync_module, survey_rows):
+    def encode():
+        return [batch for batch in sync_module.iter_insert_batches("surveys", survey_rows, bind_params=True)]
+
+    batches = benchmark(encode)
+
+    assert sum(len(rows) for _, rows in batches) == SURVEY_ROWS
+
+
+@pytest.mark.benchmark(group="push_surveys_sqlite")
+def test_push_survey_rows_to_sqlite(benchmark, sync_module, sqlite_d1, survey_rows):
+    def push():
+        batches = sync_module.iter_insert_batches("surveys", survey_rows)
+        return sum(len(pushed) for _, _, pushed, _ in sync_module.execute_d1_batches("surveys", batches))
+
+    pushed = benchmark(push)
+
+    assert pushed == SURVEY_ROWS
+    row = sqlite_d1.query("SELECT responses FROM surveys WHERE id = ?", [SURVEY_ROWS])[0]
+    assert json.loads(row["responses"]) == survey_rows[-1]["responses"]
@@ -0,0 +1,67 @@
+"""
+Regression tests for push_batch's bisecting, against the SQLite stand-in for D1
+"""
+
+import json
+
+import pytest
+
+from synthetic import make_survey_rows
+
+SURVEY_ROWS = 10
+ORPHAN_IDS = {2, 9}  # one in each half of the batch
+
+
+@pytest.fixture
+def sqlite_d1_with_foreign_keys(sync_module, tmp_path):
+    """SQLite D1 stand-in whose surveys.user_id must reference an existing user"""
+    backend = sync_module.SQLiteD1Backend(":memory:")
+    backend.conn.execute("PRAGMA foreign_keys = ON")
+    backend.conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+    columns = ", ".join(
+        "id INTEGER PRIMARY KEY" if spec[0] == "id"
+        else "user_id INTEGER REFERENCES users(id)" if spec[0] == "user_id"
+        else spec[0]
+        for spec in sync_module.TABLE_SCHEMAS["surveys"]
+    )
+    backend.conn.execute(f"CREATE TABLE surveys ({columns})")
+    dead_letters = sync_module.DeadLetterLog(str(tmp_path / "dead_letters.jsonl"))
+    sync_module.set_d1_backend(backend)
+    sync_module.set_dead_letter_log(dead_letters)
+    yield backend, dead_letters
+    sync_module.set_d1_backend(None)
+    sync_module.set_dead_letter_log(None)
+    backend.close()
+
+
+def test_push_batch_dead_letters_bad_rows_in_both_halves(sync_module, sqlite_d1_with_foreign_keys):
+    backend, dead_letters = sqlite_d1_with_foreign_keys
+    rows = make_survey_rows(SURVEY_ROWS, 2)
+    for row in rows:
+        row["user_id"] = 1000 + row["id"] if row["id"] in ORPHAN_IDS else 1
+    backend.conn.execute("INSERT INTO users (id) VALUES (1)")
+    backend.conn.commit()
+
+    (statements, batch), = sync_module.iter_insert_batches("surveys", rows)
+    pushed = sync_module.push_batch("surveys", statements, batch)
+
+    assert sorted(row["id"] for row in pushed) == sorted(set(range(1, SURVEY_ROWS + 1)) - ORPHAN_IDS)
+    assert [row["id"] for row in backend.query("SELECT id FROM surveys ORDER BY id")] == \
+        [row["id"] for row in sorted(pushed, key=lambda row: row["id"])]
+    with open(dead_letters.path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert {entry["id"] for entry in entries} == ORPHAN_IDS
+    assert all("FOREIGN KEY" in entry["error"] for entry in entries)
+
+
+def test_push_batch_raises_fatal_errors_without_bisecting(sync_module, sqlite_d1_with_foreign_keys):
+    backend, dead_letters = sqlite_d1_with_foreign_keys
+    backend.conn.execute("DROP TABLE surveys")
+    rows = make_survey_rows(SURVEY_ROWS, 2)
+
+    (statements, batch), = sync_module.iter_insert_batches("surveys", rows)
+    with pytest.raises(sync_module.D1CommandError) as excinfo:
+        sync_module.push_batch("surveys", statements, batch)
+
+    assert excinfo.value.fatal
+    assert dead_letters.count == 0
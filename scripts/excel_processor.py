@@ -4,31 +4,374 @@
 Processes Excel files and converts them to JSON format for the Cloudflare Worker
 """
 
+import numpy as np
 import pandas as pd
 import json
 import base64
+import glob
+import hashlib
 import requests
 import os
+import re
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import reduce
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Keyword rules for field types, sections and required markers
+CLASSIFIER_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "excel_classifier_rules.json")
+
+EXCEL_SUFFIXES = (".xls", ".xlsx")
+
+# Rows per DataFrame chunk in streaming mode
+STREAM_CHUNK_ROWS = 5000
+
+# Extracted structures are cached by workbook content hash + rules version;
+# bump STRUCTURE_CACHE_FORMAT whenever extraction output changes
+STRUCTURE_CACHE_DIR = os.getenv(
+    "EXCEL_STRUCTURE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "safework", "excel_structures")
+)
+STRUCTURE_CACHE_MAX_BYTES = int(os.getenv("EXCEL_STRUCTURE_CACHE_MAX_MB", "64")) * 1024 * 1024
+STRUCTURE_CACHE_FORMAT = 3
+
+# Resumable uploads send the workbook in parts of this size (R2 needs >= 5MB
+# for every part but the last); progress is kept next to the file
+UPLOAD_CHUNK_BYTES = int(os.getenv("EXCEL_UPLOAD_CHUNK_MB", "8")) * 1024 * 1024
+UPLOAD_MIN_PART_BYTES = 5 * 1024 * 1024
+UPLOAD_PROGRESS_SUFFIX = ".upload.json"
+UPLOAD_PART_RETRIES = 5
+
+# JWT sent as a Bearer token; the worker requires it for structure and chunked uploads
+WORKER_TOKEN = os.getenv("EXCEL_WORKER_TOKEN", "")
+
+# Joins a row's cells so a keyword can never match across two cells
+CELL_SEPARATOR = "\x1f"
+
+
+def unique_id(base_id, used):
+    """base_id, or base_id_2, base_id_3, ... when taken; records the result in used"""
+    candidate, suffix = base_id, 1
+    while candidate in used:
+        suffix += 1
+        candidate = f"{base_id}_{suffix}"
+    used.add(candidate)
+    return candidate
+
+
+class KeywordClassifier:
+    """Finds the highest-priority keyword class present in a text
+
+    Each class's keywords compile into one alternation. Classes are given in
+    priority order; the first one that occurs anywhere wins. The *_series
+    methods apply the same rules to a whole column at once with vectorized
+    str.contains masks, which is what extraction uses.
+    """
+
+    def __init__(self, classes, ignore_case=False):
+        self.flags = re.IGNORECASE if ignore_case else 0
+        # Classes without keywords can never match, so they are left out
+        self.names, self.patterns = [], []
+        for name, words in classes:
+            if words:
+                self.names.append(name)
+                self.patterns.append('|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True)))
+        self.compiled = [re.compile(pattern, self.flags) for pattern in self.patterns]
+        self.any_pattern = '|'.join(f"(?:{pattern})" for pattern in self.patterns) or None
+
+    def classify(self, text, default=None):
+        for name, pattern in zip(self.names, self.compiled):
+            if pattern.search(text):
+                return name
+        return default
+
+    def search(self, text):
+        return self.any_pattern is not None and re.search(self.any_pattern, text, self.flags) is not None
+
+    def classify_series(self, texts, default=None):
+        """classify() for every string in a Series, as an array"""
+        if not self.patterns:
+            return np.full(len(texts), default, dtype=object)
+        masks = [texts.str.contains(pattern, flags=self.flags, regex=True).to_numpy()
+                 for pattern in self.patterns]
+        return np.select(masks, self.names, default)
+
+    def search_series(self, texts):
+        """search() for every string in a Series, as a boolean Series"""
+        if self.any_pattern is None:
+            return pd.Series(False, index=texts.index)
+        return texts.str.contains(self.any_pattern, flags=self.flags, regex=True)
+
+
+class StructureCache:
+    """On-disk cache of extracted survey structures with size-bounded LRU eviction
+
+    Each entry is one JSON file named by its key. A hit refreshes the file's
+    mtime, and every write evicts the least recently used entries until the
+    directory fits in max_bytes, so concurrent batch workers can share it.
+    """
+
+    def __init__(self, directory=STRUCTURE_CACHE_DIR, max_bytes=STRUCTURE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(file_path, *parts):
+        """Hash of the file's content plus whatever else shapes the result"""
+        digest = hashlib.blake2b(digest_size=20)
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        digest.update(json.dumps(parts, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                structure = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another worker after the read; the structure is still good
+            pass
+        return structure
+
+    def put(self, key, structure):
+        temp_path = f"{self.path(key)}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(structure, f, ensure_ascii=False)
+        os.replace(temp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def parse_usecols(usecols):
+    """Normalize "A:C,F"-style ranges or a list of letters/indexes to sorted 0-based indexes"""
+    if usecols is None:
+        return None
+    from openpyxl.utils import column_index_from_string
+
+    def index_of(column):
+        if isinstance(column, int):
+            return column
+        column = column.strip()
+        return int(column) if column.isdigit() else column_index_from_string(column.upper()) - 1
+
+    parts = usecols.split(",") if isinstance(usecols, str) else usecols
+    indexes = set()
+    for part in parts:
+        if isinstance(part, str) and ":" in part:
+            first, last = part.split(":", 1)
+            indexes.update(range(index_of(first), index_of(last) + 1))
+        else:
+            indexes.add(index_of(part))
+    return sorted(indexes)
+
+
+def load_classifier_rules(path=CLASSIFIER_RULES_PATH):
+    """Load field type, section and required keyword rules from a JSON file"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
 
 class ExcelToSurveyProcessor:
     """Processes Excel files for SafeWork survey system"""
 
-    def __init__(self, worker_endpoint="https://safework.jclee.me/api/excel"):
+    def __init__(self, worker_endpoint="https://safework.jclee.me/api/excel", rules_path=CLASSIFIER_RULES_PATH,
+                 sheets=None, usecols=None, cache=None):
         self.worker_endpoint = worker_endpoint
         self.supported_files = [
             "002_musculoskeletal_symptom_program.xls",
             "002_musculoskeletal_symptom_program.xlsx"
         ]
+        self.rules_path = rules_path
+        # Sheets to parse (names or 0-based indexes, or "all"); None means the first sheet
+        self.sheets = sheets
+        # Columns to read, e.g. "A:C,F" or [0, 1, 2, 5]; None means every column
+        self.usecols = parse_usecols(usecols)
+        # Optional StructureCache for extracted structures
+        self.cache = cache
+        self._session = None
+        self.set_classifier_rules(load_classifier_rules(rules_path))
+
+    def set_classifier_rules(self, rules):
+        """Compile keyword rules (see excel_classifier_rules.json) into classifiers"""
+        field_types, sections = rules["field_types"], rules["sections"]
+        self.rules_version = rules.get("version")
+        # Cache keys also cover edits made without bumping the version
+        self.rules_fingerprint = (f"{self.rules_version}:" + hashlib.blake2b(
+            json.dumps(rules, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest())
+        self.default_field_type = field_types.get("default", "text")
+        self.field_type_classifier = KeywordClassifier(
+            [(rule["name"], rule["keywords"]) for rule in field_types["classes"]],
+            field_types.get("ignore_case", False)
+        )
+        self.default_section = sections.get("default", {"name": "misc", "title": "기타"})["name"]
+        self.section_classifier = KeywordClassifier(
+            [(rule["name"], rule["keywords"]) for rule in sections["classes"]],
+            sections.get("ignore_case", False)
+        )
+        self.section_titles = {rule["name"]: rule.get("title", rule["name"]) for rule in sections["classes"]}
+        self.section_titles[self.default_section] = sections.get("default", {}).get("title", "기타")
+        self.required_classifier = KeywordClassifier(
+            [("required", rules.get("required", {}).get("keywords", []))],
+            rules.get("required", {}).get("ignore_case", False)
+        )
+
+    def load_dataframe(self, file_path, sheet=0):
+        """Read one sheet of a workbook (the first by default), raising on failure"""
+        engine = 'openpyxl' if file_path.endswith('.xlsx') else 'xlrd'
+        return pd.read_excel(file_path, sheet_name=sheet, usecols=self.usecols, engine=engine)
+
+    def stream_excel_rows(self, file_path, sheet=0):
+        """Yield the data rows of one sheet as tuples without loading the sheet
+
+        .xlsx files are read with openpyxl in read-only, values-only mode; .xls
+        files go through xlrd one row at a time. The first row is skipped as
+        the header, matching read_excel_file(). Columns outside usecols are
+        never decoded.
+        """
+        usecols = self.usecols
+        if file_path.endswith('.xlsx'):
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                worksheet = workbook.worksheets[sheet] if isinstance(sheet, int) else workbook[sheet]
+                # Read-only sheets trust the stored <dimension>, which writers
+                # often get wrong; drop it so every row is read (as pandas does)
+                worksheet.reset_dimensions()
+                if usecols:
+                    rows = worksheet.iter_rows(min_col=usecols[0] + 1, max_col=usecols[-1] + 1, values_only=True)
+                    offsets = [column - usecols[0] for column in usecols]
+                    rows = (tuple(row[offset] if offset < len(row) else None for offset in offsets) for row in rows)
+                else:
+                    rows = worksheet.iter_rows(values_only=True)
+                next(rows, None)
+                # read_excel treats empty strings as missing; do the same
+                for row in rows:
+                    yield tuple(None if value == '' else value for value in row)
+            finally:
+                workbook.close()
+        else:
+            import xlrd
+
+            workbook = xlrd.open_workbook(file_path, on_demand=True)
+            try:
+                worksheet = workbook.sheet_by_index(sheet) if isinstance(sheet, int) else workbook.sheet_by_name(sheet)
+                for index in range(1, worksheet.nrows):
+                    cells = worksheet.row(index)
+                    if usecols:
+                        cells = [cells[column] for column in usecols if column < len(cells)]
+                    yield tuple(None if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK) or cell.value == ''
+                                else cell.value for cell in cells)
+            finally:
+                workbook.release_resources()
+
+    def resolve_sheets(self, file_path):
+        """Names of the sheets selected by self.sheets, in workbook order"""
+        if self.sheets is None:
+            return [0]
+        engine = 'openpyxl' if file_path.endswith('.xlsx') else 'xlrd'
+        with pd.ExcelFile(file_path, engine=engine) as workbook:
+            names = workbook.sheet_names
+        if self.sheets == "all":
+            return names
+
+        selected = []
+        for sheet in self.sheets:
+            name = names[sheet] if isinstance(sheet, int) and 0 <= sheet < len(names) else sheet
+            if name not in names:
+                raise ValueError(f"Sheet not found: {sheet} (available: {', '.join(names)})")
+            selected.append(name)
+        return [name for name in names if name in selected]
+
+    def extract_sheet_fields(self, file_path, sheet=0, stream=False):
+        """Extract the fields of one sheet, streamed or through a DataFrame"""
+        if stream:
+            return self.extract_survey_structure_from_rows(self.stream_excel_rows(file_path, sheet))["fields"]
+        return self.extract_fields(self.load_dataframe(file_path, sheet))
+
+    def extract_workbook_structure(self, file_path, stream=False, max_workers=None):
+        """Extract the survey structure of the selected sheets of a workbook
+
+        A single sheet keeps the usual keyword sections. With several sheets,
+        they are parsed concurrently in worker processes and each becomes its
+        own section; the keyword section of each field moves to "category".
+        """
+        sheets = self.resolve_sheets(file_path)
+        survey_structure = self.new_survey_structure()
+
+        if len(sheets) == 1:
+            fields = self.extract_sheet_fields(file_path, sheets[0], stream)
+            survey_structure["fields"] = fields
+            survey_structure["sections"] = self.group_fields_into_sections(fields)
+            return survey_structure
+
+        workers = max(1, min(max_workers or os.cpu_count() or 1, len(sheets)))
+        if workers == 1:
+            sheet_fields = [self.extract_sheet_fields(file_path, sheet, stream) for sheet in sheets]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                     initargs=(self.rules_path, self.usecols)) as pool:
+                sheet_fields = list(pool.map(_extract_sheet_fields, [file_path] * len(sheets), sheets,
+                                             [stream] * len(sheets)))
+
+        section_ids, field_ids = set(), set()
+        for index, (sheet, fields) in enumerate(zip(sheets, sheet_fields)):
+            if not fields:
+                continue
+            # Names like "Sheet 1" and "sheet_1" reduce to the same id
+            section_id = unique_id(self.generate_field_id(sheet) or f"sheet_{index + 1}", section_ids)
+            for field in fields:
+                # Sheets often repeat labels (e.g. a "부서명" header on each), so
+                # field ids are namespaced by their sheet's section
+                field["id"] = unique_id(f"{section_id}__{field['id']}", field_ids)
+                field["category"] = field["section"]
+                field["section"] = section_id
+            survey_structure["fields"].extend(fields)
+            survey_structure["sections"].append({
+                "id": section_id,
+                "title": sheet,
+                "fields": [field["id"] for field in fields]
+            })
+        return survey_structure
 
     def read_excel_file(self, file_path):
         """Read Excel file and return DataFrame"""
         try:
-            if file_path.endswith('.xlsx'):
-                df = pd.read_excel(file_path, engine='openpyxl')
-            else:
-                df = pd.read_excel(file_path, engine='xlrd')
+            df = self.load_dataframe(file_path)
 
             print(f"✅ Successfully read Excel file: {file_path}")
             print(f"📊 Dimensions: {df.shape[0]} rows x {df.shape[1]} columns")
@@ -38,9 +381,9 @@ def read_excel_file(self, file_path):
             print(f"❌ Error reading Excel file: {str(e)}")
             return None
 
-    def extract_survey_structure(self, df):
-        """Extract survey structure from Excel DataFrame"""
-        survey_structure = {
+    def new_survey_structure(self):
+        """Empty survey structure for the 002 form"""
+        return {
             "formId": "002_musculoskeletal_symptom_program",
             "title": "근골격계부담작업 유해요인조사",
             "description": "근골격계 질환 예방을 위한 작업환경 유해요인 조사",
@@ -48,72 +391,95 @@ def extract_survey_structure(self, df):
             "fields": []
         }
 
-        # Parse Excel structure to identify sections and fields
-        sections = {}
-        fields = []
-
-        for index, row in df.iterrows():
-            # Skip empty rows
-            if pd.isna(row).all():
-                continue
+    def extract_survey_structure(self, df):
+        """Extract survey structure from Excel DataFrame"""
+        survey_structure = self.new_survey_structure()
+        fields = self.extract_fields(df)
 
-            # Check if this is a section header (usually in first column)
-            if not pd.isna(row.iloc[0]):
-                section_name = str(row.iloc[0]).strip()
+        # Group fields into sections
+        survey_structure["fields"] = fields
+        survey_structure["sections"] = self.group_fields_into_sections(fields)
 
-                # Identify field types based on column structure
-                if len(row) > 1 and not pd.isna(row.iloc[1]):
-                    field_type = self.identify_field_type(row)
-                    field_id = self.generate_field_id(section_name)
+        return survey_structure
 
-                    field = {
-                        "id": field_id,
-                        "type": field_type,
-                        "label": section_name,
-                        "required": self.is_field_required(row),
-                        "section": self.get_section_for_field(section_name)
-                    }
+    def extract_survey_structure_from_rows(self, rows, chunk_rows=STREAM_CHUNK_ROWS):
+        """Extract survey structure from an iterable of row tuples, chunk by chunk
 
-                    # Add options for select fields
-                    if field_type in ["select", "radio", "checkbox"]:
-                        field["options"] = self.extract_field_options(row)
+        Only chunk_rows rows are held at a time, so memory stays flat however
+        long the sheet is. Cells keep their stored types (no per-column dtype
+        upcasting), so numeric options read as the sheet shows them.
+        """
+        survey_structure = self.new_survey_structure()
+        fields = []
 
-                    fields.append(field)
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                fields.extend(self.extract_fields(pd.DataFrame(chunk, dtype=object)))
+                chunk = []
+        if chunk:
+            fields.extend(self.extract_fields(pd.DataFrame(chunk, dtype=object)))
 
-        # Group fields into sections
         survey_structure["fields"] = fields
         survey_structure["sections"] = self.group_fields_into_sections(fields)
 
         return survey_structure
 
-    def identify_field_type(self, row):
-        """Identify field type based on Excel row content"""
-        # Check for dropdown/select indicators
-        if any("선택" in str(cell) for cell in row if not pd.isna(cell)):
-            return "select"
+    def extract_fields(self, df):
+        """Extract field definitions from a DataFrame of sheet rows
+
+        The frame is converted to strings once and each row's cells are joined
+        into a single string, which the keyword classifiers match with one
+        vectorized str.contains per keyword class instead of per row.
+        """
+        # A field is a row with a label in the first column and content in the second
+        if df.shape[1] < 2 or df.empty:
+            return []
+        is_field = df.iloc[:, 0].notna() & df.iloc[:, 1].notna()
+        if not is_field.any():
+            return []
+
+        frame = df[is_field]
+        text = frame.astype(str).where(frame.notna(), "")
+        row_text = reduce(lambda joined, column: joined + CELL_SEPARATOR + column,
+                          (text.iloc[:, i] for i in range(1, text.shape[1])), text.iloc[:, 0])
+
+        cells = text.to_numpy(dtype=object)
+        labels = text.iloc[:, 0].str.strip()
+        field_types = self.field_type_classifier.classify_series(row_text, self.default_field_type)
+        field_sections = self.section_classifier.classify_series(labels, self.default_section)
+        required = self.required_classifier.search_series(row_text)
+        field_ids = (labels.str.replace(r'[^\w\s]', '', regex=True).str.strip()
+                     .str.replace(r'\s+', '_', regex=True).str.lower())
 
-        # Check for checkbox indicators
-        if any("체크" in str(cell) or "□" in str(cell) for cell in row if not pd.isna(cell)):
-            return "checkbox"
+        fields = []
+        for position, (field_id, field_type, label, is_required, section) in enumerate(
+                zip(field_ids, field_types, labels, required, field_sections)):
+            field = {
+                "id": field_id,
+                "type": field_type,
+                "label": label,
+                "required": is_required,
+                "section": section
+            }
 
-        # Check for date indicators
-        if any("날짜" in str(cell) or "일자" in str(cell) for cell in row if not pd.isna(cell)):
-            return "date"
+            # Add options for select fields
+            if field_type in ["select", "radio", "checkbox"]:
+                options = list(dict.fromkeys(filter(None, (cell.strip() for cell in cells[position, 1:]))))
+                field["options"] = options if options else ["예", "아니오"]
 
-        # Check for number indicators
-        if any("점수" in str(cell) or "수치" in str(cell) for cell in row if not pd.isna(cell)):
-            return "number"
+            fields.append(field)
 
-        # Check for textarea indicators
-        if any("설명" in str(cell) or "의견" in str(cell) for cell in row if not pd.isna(cell)):
-            return "textarea"
+        return fields
 
-        # Default to text
-        return "text"
+    def identify_field_type(self, row):
+        """Identify field type based on Excel row content"""
+        row_text = CELL_SEPARATOR.join(str(cell) for cell in row if not pd.isna(cell))
+        return self.field_type_classifier.classify(row_text, self.default_field_type)
 
     def generate_field_id(self, label):
         """Generate field ID from label"""
-        import re
         # Remove special characters and convert to snake_case
         field_id = re.sub(r'[^\w\s]', '', label)
         field_id = re.sub(r'\s+', '_', field_id.strip())
@@ -121,28 +487,16 @@ def generate_field_id(self, label):
 
     def is_field_required(self, row):
         """Determine if field is required based on Excel content"""
-        required_indicators = ["필수", "required", "*"]
-        return any(indicator in str(cell) for cell in row for indicator in required_indicators if not pd.isna(cell))
+        return any(self.required_classifier.search(str(cell)) for cell in row if not pd.isna(cell))
 
     def get_section_for_field(self, field_name):
         """Determine section for field based on field name"""
-        field_lower = field_name.lower()
-
-        if any(keyword in field_lower for keyword in ["회사", "부서", "조사자", "일자"]):
-            return "basic_info"
-        elif any(keyword in field_lower for keyword in ["자세", "반복", "힘", "진동"]):
-            return "work_environment"
-        elif any(keyword in field_lower for keyword in ["위험", "요인", "평가"]):
-            return "risk_factors"
-        elif any(keyword in field_lower for keyword in ["개선", "방안", "계획"]):
-            return "recommendations"
-        else:
-            return "misc"
+        return self.section_classifier.classify(field_name, self.default_section)
 
     def extract_field_options(self, row):
         """Extract options for select/radio/checkbox fields"""
         options = []
-        for cell in row[1:]:  # Skip first column (label)
+        for cell in row.iloc[1:]:  # Skip first column (label)
             if not pd.isna(cell):
                 option = str(cell).strip()
                 if option and option not in options:
@@ -153,15 +507,12 @@ def extract_field_options(self, row):
     def group_fields_into_sections(self, fields):
         """Group fields into logical sections"""
         sections = {
-            "basic_info": {"id": "basic_info", "title": "기본 정보", "fields": []},
-            "work_environment": {"id": "work_environment", "title": "작업환경 평가", "fields": []},
-            "risk_factors": {"id": "risk_factors", "title": "위험요인 분석", "fields": []},
-            "recommendations": {"id": "recommendations", "title": "개선방안", "fields": []},
-            "misc": {"id": "misc", "title": "기타", "fields": []}
+            section_id: {"id": section_id, "title": title, "fields": []}
+            for section_id, title in self.section_titles.items()
         }
 
         for field in fields:
-            section_id = field.get("section", "misc")
+            section_id = field.get("section", self.default_section)
             if section_id in sections:
                 sections[section_id]["fields"].append(field["id"])
 
@@ -179,54 +530,175 @@ def encode_file_for_worker(self, file_path):
             print(f"❌ Error encoding file: {str(e)}")
             return None
 
-    def send_to_worker(self, file_path):
-        """Send Excel file to Cloudflare Worker for processing"""
+    @property
+    def session(self):
+        """Keep-alive HTTP session shared by every worker request"""
+        if self._session is None:
+            # Only idempotent requests are retried at the transport level
+            retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset({"GET", "PUT"}))
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+            self._session = requests.Session()
+            if WORKER_TOKEN:
+                self._session.headers["Authorization"] = f"Bearer {WORKER_TOKEN}"
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+        return self._session
+
+    def send_to_worker(self, file_path, mode="json", chunk_size=UPLOAD_CHUNK_BYTES, stream=False):
+        """Send Excel file to Cloudflare Worker for processing
+
+        mode "json" posts the base64 workbook in one request, "chunked" runs
+        a resumable multipart upload, and "structure" extracts the survey
+        structure locally and posts only that.
+        """
         file_name = os.path.basename(file_path)
 
         if file_name not in self.supported_files:
             print(f"❌ Unsupported file: {file_name}")
             return False
 
-        encoded_data = self.encode_file_for_worker(file_path)
-        if not encoded_data:
-            return False
-
-        payload = {
-            "fileData": encoded_data,
-            "fileName": file_name
-        }
-
         try:
-            response = requests.post(
-                f"{self.worker_endpoint}/process-excel",
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                print(f"✅ Successfully processed by worker:")
-                print(f"   Survey ID: {result.get('surveyId')}")
-                print(f"   Fields Count: {result.get('fieldsCount')}")
-                print(f"   Sections: {result.get('sections')}")
-                return True
+            if mode == "chunked":
+                result = self.upload_file_chunked(file_path, chunk_size)
+            elif mode == "structure":
+                structure, _ = self.build_structure(file_path, stream)
+                result = self.post_to_worker({"fileName": file_name, "structure": structure})
             else:
-                print(f"❌ Worker processing failed: {response.status_code}")
-                print(f"   Response: {response.text}")
-                return False
+                encoded_data = self.encode_file_for_worker(file_path)
+                if not encoded_data:
+                    return False
+                result = self.post_to_worker({"fileData": encoded_data, "fileName": file_name})
+
+            print(f"✅ Successfully processed by worker:")
+            print(f"   Survey ID: {result.get('surveyId')}")
+            print(f"   Fields Count: {result.get('fieldsCount')}")
+            print(f"   Sections: {result.get('sections')}")
+            return True
 
+        except requests.HTTPError as e:
+            print(f"❌ Worker processing failed: {e.response.status_code}")
+            print(f"   Response: {e.response.text}")
+            return False
         except Exception as e:
             print(f"❌ Error sending to worker: {str(e)}")
             return False
 
-    def process_file_locally(self, file_path, output_path=None):
-        """Process Excel file locally and save JSON structure"""
-        df = self.read_excel_file(file_path)
-        if df is None:
+    def post_to_worker(self, payload):
+        """POST a JSON payload to process-excel and return the response body"""
+        response = self.session.post(f"{self.worker_endpoint}/process-excel", json=payload, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def upload_file_chunked(self, file_path, chunk_size=UPLOAD_CHUNK_BYTES):
+        """Upload a workbook part by part, resuming a previous attempt if one was interrupted
+
+        Progress (upload id plus the etag of every stored part) is written to
+        <file>.upload.json after each part, so a rerun only sends what is
+        missing. Parts are read from disk one at a time, never the whole file.
+        """
+        chunk_size = max(chunk_size, UPLOAD_MIN_PART_BYTES)
+        stat = os.stat(file_path)
+        progress_path = file_path + UPLOAD_PROGRESS_SUFFIX
+        upload_url = f"{self.worker_endpoint}/uploads"
+
+        progress = None
+        if os.path.exists(progress_path):
+            with open(progress_path, 'r', encoding='utf-8') as f:
+                progress = json.load(f)
+            # A changed file or part size means the stored parts no longer line up
+            if (progress.get("size"), progress.get("mtime"), progress.get("chunkSize")) != (
+                    stat.st_size, stat.st_mtime, chunk_size):
+                progress = None
+            else:
+                response = self.session.get(f"{upload_url}/{progress['uploadId']}", timeout=30)
+                if response.status_code == 404:
+                    progress = None
+                else:
+                    response.raise_for_status()
+                    # Trust only parts the worker confirms it has
+                    received = set(response.json().get("parts", []))
+                    progress["parts"] = [part for part in progress["parts"] if part["partNumber"] in received]
+                    print(f"🔄 Resuming upload {progress['uploadId']} ({len(progress['parts'])} parts already sent)")
+
+        if progress is None:
+            response = self.session.post(upload_url, json={
+                "fileName": os.path.basename(file_path), "size": stat.st_size, "chunkSize": chunk_size
+            }, timeout=30)
+            response.raise_for_status()
+            progress = {"uploadId": response.json()["uploadId"], "size": stat.st_size,
+                        "mtime": stat.st_mtime, "chunkSize": chunk_size, "parts": []}
+
+        def save_progress():
+            with open(progress_path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(progress, f)
+            os.replace(progress_path + ".tmp", progress_path)
+
+        save_progress()
+        part_count = max(1, -(-stat.st_size // chunk_size))
+        sent = {part["partNumber"] for part in progress["parts"]}
+
+        with open(file_path, 'rb') as f:
+            for part_number in range(1, part_count + 1):
+                if part_number in sent:
+                    continue
+                f.seek((part_number - 1) * chunk_size)
+                chunk = f.read(chunk_size)
+                for attempt in range(1, UPLOAD_PART_RETRIES + 1):
+                    try:
+                        response = self.session.put(
+                            f"{upload_url}/{progress['uploadId']}/parts/{part_number}",
+                            data=chunk,
+                            headers={"Content-Type": "application/octet-stream"},
+                            timeout=(10, 120)
+                        )
+                        response.raise_for_status()
+                        break
+                    except (requests.ConnectionError, requests.Timeout):
+                        if attempt == UPLOAD_PART_RETRIES:
+                            raise
+                        time.sleep(min(2 ** attempt, 30))
+                progress["parts"].append({"partNumber": part_number, "etag": response.json()["etag"]})
+                save_progress()
+                print(f"   📤 Part {part_number}/{part_count} uploaded")
+
+        progress["parts"].sort(key=lambda part: part["partNumber"])
+        response = self.session.post(f"{upload_url}/{progress['uploadId']}/complete",
+                                     json={"parts": progress["parts"]}, timeout=60)
+        response.raise_for_status()
+        os.remove(progress_path)
+        return response.json()
+
+    def build_structure(self, file_path, stream=False, max_workers=None):
+        """Return (survey structure, served from cache) for a workbook"""
+        if self.cache is None:
+            return self.extract_workbook_structure(file_path, stream, max_workers), False
+
+        key = self.cache.key(file_path, STRUCTURE_CACHE_FORMAT, self.rules_fingerprint,
+                             self.sheets, self.usecols, stream)
+        survey_structure = self.cache.get(key)
+        if survey_structure is not None:
+            return survey_structure, True
+
+        survey_structure = self.extract_workbook_structure(file_path, stream, max_workers)
+        self.cache.put(key, survey_structure)
+        return survey_structure, False
+
+    def process_file_locally(self, file_path, output_path=None, stream=False):
+        """Process Excel file locally and save JSON structure
+
+        With stream=True the sheet is read row by row instead of as a DataFrame.
+        """
+        try:
+            survey_structure, cached = self.build_structure(file_path, stream)
+        except Exception as e:
+            print(f"❌ Error reading Excel file: {str(e)}")
             return False
 
-        survey_structure = self.extract_survey_structure(df)
+        if cached:
+            print(f"♻️ Unchanged workbook, using cached structure: {file_path}")
+        else:
+            print(f"✅ Successfully {'streamed' if stream else 'read'} Excel file: {file_path}")
 
         if output_path is None:
             output_path = file_path.replace('.xls', '_structure.json').replace('.xlsx', '_structure.json')
@@ -247,33 +719,152 @@ def process_file_locally(self, file_path, output_path=None):
             print(f"❌ Error saving structure: {str(e)}")
             return False
 
+    def process_batch(self, file_paths, output_dir, max_workers=None, stream=False):
+        """Parse workbooks in parallel processes, writing one structure JSON per file
+
+        A manifest.json in output_dir lists every file with its status,
+        field/section counts and parse time. Returns the manifest.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+
+        output_paths, used = [], set()
+        for file_path in file_paths:
+            stem = Path(file_path).stem
+            name, suffix = f"{stem}_structure.json", 2
+            while name in used:
+                name, suffix = f"{stem}_{suffix}_structure.json", suffix + 1
+            used.add(name)
+            output_paths.append(os.path.join(output_dir, name))
+
+        cache_options = None if self.cache is None else (self.cache.directory, self.cache.max_bytes)
+        workers = max(1, min(max_workers or os.cpu_count() or 1, len(file_paths)))
+        print(f"🔄 Processing {len(file_paths)} workbooks with {workers} worker processes...")
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(self.rules_path, self.usecols, self.sheets, cache_options)) as pool:
+            entries = list(pool.map(_process_batch_file, file_paths, output_paths,
+                                    [stream] * len(file_paths)))
+
+        manifest = {
+            "generatedAt": datetime.now().isoformat(),
+            "rulesVersion": self.rules_version,
+            "seconds": round(time.perf_counter() - started, 3),
+            "files": entries
+        }
+        manifest_path = os.path.join(output_dir, "manifest.json")
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        failed = [entry for entry in entries if entry["status"] != "ok"]
+        for entry in failed:
+            print(f"❌ {entry['file']}: {entry['error']}")
+        cached = sum(1 for entry in entries if entry.get("cached"))
+        print(f"✅ {len(entries) - len(failed)}/{len(entries)} workbooks processed in {manifest['seconds']}s"
+              f" ({cached} from cache)")
+        print(f"📝 Manifest saved to: {manifest_path}")
+        return manifest
+
+
+# Each batch worker process compiles the classifier rules once
+_batch_processor = None
+
+
+def _init_batch_worker(rules_path, usecols=None, sheets=None, cache_options=None):
+    global _batch_processor
+    cache = StructureCache(*cache_options) if cache_options else None
+    _batch_processor = ExcelToSurveyProcessor(rules_path=rules_path, sheets=sheets, usecols=usecols, cache=cache)
+
+
+def _extract_sheet_fields(file_path, sheet, stream=False):
+    return _batch_processor.extract_sheet_fields(file_path, sheet, stream)
+
+
+def _process_batch_file(file_path, output_path, stream=False):
+    """Parse one workbook inside a batch worker and report the outcome"""
+    started = time.perf_counter()
+    entry = {"file": file_path, "output": output_path}
+    try:
+        # Files are already spread over the processes; sheets run sequentially here
+        structure, cached = _batch_processor.build_structure(file_path, stream, max_workers=1)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(structure, f, ensure_ascii=False, indent=2)
+        entry.update(status="ok", sections=len(structure["sections"]), fields=len(structure["fields"]),
+                     cached=cached)
+    except Exception as e:
+        entry.update(status="error", error=str(e))
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    return entry
+
+
+def expand_input_paths(patterns):
+    """Resolve files, directories and glob patterns into a sorted list of workbooks"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [str(path) for path in Path(pattern).iterdir() if path.suffix.lower() in EXCEL_SUFFIXES]
+        elif any(char in pattern for char in "*?["):
+            matches = glob.glob(pattern, recursive=True)
+        else:
+            matches = [pattern]
+        # Skip the lock files Excel leaves next to open workbooks
+        paths.extend(path for path in matches if not os.path.basename(path).startswith("~$"))
+    return sorted(dict.fromkeys(paths))
+
+
 def main():
     """Main function for command line usage"""
     if len(sys.argv) < 2:
-        print("Usage: python excel_processor.py <excel_file_path> [--local] [--worker] [--output <output_path>]")
+        print("Usage: python excel_processor.py <excel_file_path|directory|glob> [...] [--local] [--worker] [--output <output_path>] [--jobs <n>]")
         print("Options:")
         print("  --local   Process locally and save JSON structure")
         print("  --worker  Send to Cloudflare Worker for processing")
-        print("  --output  Specify output path for local processing")
-        sys.exit(1)
-
-    file_path = sys.argv[1]
-
-    if not os.path.exists(file_path):
-        print(f"❌ File not found: {file_path}")
+        print("  --output  Specify output path for local processing (output directory in batch mode)")
+        print("  --batch   Process every workbook given in parallel (implied by directories, globs or several files)")
+        print("  --jobs    Worker processes for batch mode (default: CPU count)")
+        print("  --stream  Read sheets row by row (openpyxl read-only) to keep memory flat on large workbooks")
+        print("  --sheets  Comma-separated sheet names or 0-based indexes, or 'all' (default: first sheet)")
+        print("  --usecols Column ranges to read, e.g. 'A:D,G' (default: all columns)")
+        print(f"  --cache-dir Structure cache directory (default: {STRUCTURE_CACHE_DIR})")
+        print("  --no-cache  Always parse workbooks, ignoring the structure cache")
+        print("  --upload  How --worker sends a file: json (default), chunked (resumable) or structure")
+        print("            (chunked and structure need a worker JWT in EXCEL_WORKER_TOKEN)")
+        print(f"  --chunk-size Part size in MB for chunked uploads (default: {UPLOAD_CHUNK_BYTES // (1024 * 1024)})")
         sys.exit(1)
 
-    processor = ExcelToSurveyProcessor()
-
     # Parse command line options
+    value_options = {"--output": None, "--jobs": None, "--sheets": None, "--usecols": None,
+                     "--cache-dir": STRUCTURE_CACHE_DIR, "--upload": "json", "--chunk-size": None}
+    inputs = []
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg in value_options:
+            value_options[arg] = next(args, None)
+        elif not arg.startswith("--"):
+            inputs.append(arg)
+
     local_processing = "--local" in sys.argv
     worker_processing = "--worker" in sys.argv
-    output_path = None
+    stream = "--stream" in sys.argv
+    output_path = value_options["--output"]
+
+    batch = ("--batch" in sys.argv or len(inputs) > 1
+             or any(os.path.isdir(path) or any(char in path for char in "*?[") for path in inputs))
+    file_paths = expand_input_paths(inputs) if batch else inputs[:1]
+
+    if not file_paths:
+        print(f"❌ No Excel files found in: {' '.join(inputs)}")
+        sys.exit(1)
+    for file_path in file_paths:
+        if not os.path.exists(file_path):
+            print(f"❌ File not found: {file_path}")
+            sys.exit(1)
+
+    sheets = value_options["--sheets"]
+    if sheets and sheets != "all":
+        sheets = [int(sheet) if sheet.strip().isdigit() else sheet.strip() for sheet in sheets.split(",")]
 
-    if "--output" in sys.argv:
-        output_index = sys.argv.index("--output")
-        if output_index + 1 < len(sys.argv):
-            output_path = sys.argv[output_index + 1]
+    cache = None if "--no-cache" in sys.argv else StructureCache(value_options["--cache-dir"])
+    processor = ExcelToSurveyProcessor(sheets=sheets, usecols=value_options["--usecols"], cache=cache)
 
     # Default to local processing if no option specified
     if not local_processing and not worker_processing:
@@ -281,13 +872,20 @@ def main():
 
     success = True
 
-    if local_processing:
+    if local_processing and batch:
+        jobs = int(value_options["--jobs"]) if value_options["--jobs"] else None
+        manifest = processor.process_batch(file_paths, output_path or "excel_structures", jobs, stream)
+        success &= all(entry["status"] == "ok" for entry in manifest["files"])
+    elif local_processing:
         print("🔄 Processing Excel file locally...")
-        success &= processor.process_file_locally(file_path, output_path)
+        success &= processor.process_file_locally(file_paths[0], output_path, stream)
 
     if worker_processing:
-        print("🔄 Sending to Cloudflare Worker...")
-        success &= processor.send_to_worker(file_path)
+        for file_path in file_paths:
+            print(f"🔄 Sending {file_path} to Cloudflare Worker...")
+            chunk_size = (int(value_options["--chunk-size"]) * 1024 * 1024
+                          if value_options["--chunk-size"] else UPLOAD_CHUNK_BYTES)
+            success &= processor.send_to_worker(file_path, value_options["--upload"], chunk_size, stream)
 
     if success:
         print("✅ Processing completed successfully!")
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Async client for the SafeWork Excel Worker (/api/excel)
+Submits many workbooks, structures or validations concurrently over one
+keep-alive connection pool, holding back when the worker rate-limits
+
+Requires aiohttp (pip install aiohttp).
+
+Library use:
+    async with ExcelWorkerClient(concurrency=32) as client:
+        results = await client.gather(client.process_excel(path) for path in paths)
+"""
+
+import asyncio
+import base64
+import email.utils
+import json
+import os
+import random
+import sys
+import time
+
+try:
+    import aiohttp
+except ImportError:  # reported when a client is created
+    aiohttp = None
+
+WORKER_ENDPOINT = os.getenv("EXCEL_WORKER_ENDPOINT", "https://safework.jclee.me/api/excel")
+# JWT sent as a Bearer token; the worker requires it for structure uploads
+WORKER_TOKEN = os.getenv("EXCEL_WORKER_TOKEN", "")
+
+# In-flight requests per client; the connection pool is sized to match
+CLIENT_CONCURRENCY = int(os.getenv("EXCEL_WORKER_CONCURRENCY", "16"))
+# Optional client-side ceiling in requests per second (0 = unlimited)
+CLIENT_RATE_LIMIT = float(os.getenv("EXCEL_WORKER_RATE_LIMIT", "0"))
+CLIENT_MAX_RETRIES = 5
+CLIENT_TIMEOUT = 60
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 60
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class WorkerError(Exception):
+    """Non-retryable (or retries exhausted) error response from the worker"""
+
+    def __init__(self, status, body):
+        super().__init__(f"worker returned {status}: {body}")
+        self.status = status
+        self.body = body
+
+
+class RateLimiter:
+    """Spaces requests to a steady rate and pauses everyone after a 429
+
+    A pause set by one request (Retry-After, or an exhausted
+    X-RateLimit-Remaining) applies to every task sharing the limiter, so a
+    rate-limited worker sees one retry instead of a burst of them.
+    """
+
+    def __init__(self, rate=0):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_slot, self.paused_until)
+            self.next_slot = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def retry_after_seconds(headers, body):
+    """Delay requested by a 429/503, from Retry-After or the body's retryAfter"""
+    value = headers.get("Retry-After")
+    if value:
+        if value.strip().isdigit():
+            return int(value)
+        try:
+            return max(0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    if isinstance(body, dict) and isinstance(body.get("retryAfter"), (int, float)):
+        return body["retryAfter"]
+    return None
+
+
+def rate_limit_reset_seconds(headers):
+    """Seconds until the window resets when X-RateLimit-Remaining has hit 0"""
+    remaining, reset = headers.get("X-RateLimit-Remaining"), headers.get("X-RateLimit-Reset")
+    if remaining is None or reset is None or int(remaining) > 0:
+        return None
+    # The worker's rate limiter reports the reset time in epoch milliseconds
+    reset = float(reset)
+    reset_at = reset / 1000 if reset > 1e11 else reset
+    return max(0, reset_at - time.time())
+
+
+class ExcelWorkerClient:
+    """Bounded-concurrency asyncio client for the Excel worker endpoints"""
+
+    def __init__(self, worker_endpoint=WORKER_ENDPOINT, concurrency=CLIENT_CONCURRENCY,
+                 rate_limit=CLIENT_RATE_LIMIT, max_retries=CLIENT_MAX_RETRIES, timeout=CLIENT_TIMEOUT,
+                 token=WORKER_TOKEN):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for the async worker client: pip install aiohttp")
+        self.worker_endpoint = worker_endpoint.rstrip("/")
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.token = token
+        self.limiter = RateLimiter(rate_limit)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = None
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else None
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout), headers=headers
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def request(self, method, path, payload=None, allow_404=False):
+        """Send one request, retrying rate limits, 5xx and connection errors with backoff"""
+        url = f"{self.worker_endpoint}{path}"
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire()
+                self.stats["requests"] += 1
+                try:
+                    async with self.session.request(method, url, json=payload) as response:
+                        text = await response.text()
+                        status, headers = response.status, response.headers
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = None
+                    error = e
+                else:
+                    try:
+                        body = json.loads(text) if text else None
+                    except ValueError:
+                        # e.g. an HTML error page from the edge
+                        body = text
+                    reset = rate_limit_reset_seconds(headers)
+                    if reset:
+                        self.limiter.pause(reset)
+                    if status < 400 or (status == 404 and allow_404):
+                        return body if status < 400 else None
+                    if status not in RETRY_STATUSES or attempt == self.max_retries:
+                        raise WorkerError(status, body)
+                    delay = retry_after_seconds(headers, body)
+                    error = WorkerError(status, body)
+                    if status == 429:
+                        self.stats["rate_limited"] += 1
+
+                self.stats["retries"] += 1
+                if delay is None:
+                    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * (0.5 + random.random())
+                else:
+                    self.limiter.pause(delay)
+                print(f"⚠️  {method} {path} failed ({error}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def process_excel(self, file_path):
+        """Upload a workbook (base64) to /process-excel"""
+        with open(file_path, "rb") as f:
+            file_data = base64.b64encode(f.read()).decode("utf-8")
+        return await self.request("POST", "/process-excel",
+                                  {"fileData": file_data, "fileName": os.path.basename(file_path)})
+
+    async def process_structure(self, file_name, structure):
+        """Send a locally extracted survey structure to /process-excel"""
+        return await self.request("POST", "/process-excel", {"fileName": file_name, "structure": structure})
+
+    async def get_form_structure(self, form_id):
+        """Return the stored structure for form_id, or None if there is none"""
+        return await self.request("GET", f"/form-structure/{form_id}", allow_404=True)
+
+    async def export_to_excel(self, form_type, responses, format="xlsx"):
+        return await self.request("POST", "/export-to-excel",
+                                  {"formType": form_type, "responses": responses, "format": format})
+
+    async def validate_excel(self, file_data, expected_fields):
+        """Validate base64 workbook data against the expected field ids"""
+        return await self.request("POST", "/validate-excel",
+                                  {"fileData": file_data, "expectedFields": expected_fields})
+
+    @staticmethod
+    async def gather(coroutines):
+        """Run coroutines concurrently; failures come back as exceptions in place"""
+        return await asyncio.gather(*coroutines, return_exceptions=True)
+
+
+async def submit_files(file_paths, mode, worker_endpoint, concurrency, rate_limit):
+    """Submit every file and print one line per result"""
+    async with ExcelWorkerClient(worker_endpoint, concurrency, rate_limit) as client:
+        if mode == "structure":
+            async def submit(path):
+                # Read inside the coroutine, so a bad file fails only its own result
+                with open(path, "r", encoding="utf-8") as f:
+                    structure = json.load(f)
+                return await client.process_structure(structure.get("formId", os.path.basename(path)), structure)
+        else:
+            submit = client.process_excel
+
+        started = time.perf_counter()
+        results = await client.gather(submit(path) for path in file_paths)
+        elapsed = time.perf_counter() - started
+
+        failures = 0
+        for path, result in zip(file_paths, results):
+            if isinstance(result, BaseException):
+                failures += 1
+                print(f"❌ {path}: {result}")
+            else:
+                print(f"✅ {path}: {result.get('fieldsCount')} fields, {result.get('sections')} sections")
+
+        print(f"📊 {len(file_paths) - failures}/{len(file_paths)} submitted in {elapsed:.1f}s "
+              f"({client.stats['requests']} requests, {client.stats['retries']} retries, "
+              f"{client.stats['rate_limited']} rate-limited)")
+        return failures == 0
+
+
+def main():
+    """Main function for command line usage"""
+    if len(sys.argv) < 2:
+        print("Usage: python excel_worker_client.py <file> [...] [--structure] [--concurrency <n>] [--rate <rps>] [--endpoint <url>]")
+        print("Options:")
+        print("  --structure    Inputs are structure JSON files (excel_processor.py --local output), not workbooks")
+        print(f"  --concurrency  Requests in flight at once (default: {CLIENT_CONCURRENCY})")
+        print("  --rate         Client-side requests per second ceiling (default: unlimited)")
+        print(f"  --endpoint     Worker base URL (default: {WORKER_ENDPOINT})")
+        sys.exit(1)
+
+    value_options = {"--concurrency": str(CLIENT_CONCURRENCY), "--rate": str(CLIENT_RATE_LIMIT),
+                     "--endpoint": WORKER_ENDPOINT}
+    inputs = []
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg in value_options:
+            value_options[arg] = next(args, None)
+        elif not arg.startswith("--"):
+            inputs.append(arg)
+
+    for path in inputs:
+        if not os.path.exists(path):
+            print(f"❌ File not found: {path}")
+            sys.exit(1)
+
+    mode = "structure" if "--structure" in sys.argv else "excel"
+    success = asyncio.run(submit_files(inputs, mode, value_options["--endpoint"],
+                                       int(value_options["--concurrency"]), float(value_options["--rate"])))
+    if not success:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Excel Worker (/api/excel)
+Serves process-excel, form-structure, export-to-excel and validate-excel
+with the same response shapes as workers/src/routes/excel-processor.ts,
+backed by an in-memory KV, so clients and benchmarks can run offline
+
+Usage: python excel_worker_mock.py [--port 8787] [--latency <ms>] [--jitter <ms>]
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FORM_ID = "002_musculoskeletal_symptom_program"
+
+DEFAULT_STRUCTURE = {
+    "formId": FORM_ID,
+    "title": "근골격계부담작업 유해요인조사",
+    "description": "근골격계 질환 예방을 위한 작업환경 유해요인 조사",
+    "sections": [
+        {"id": "basic_info", "title": "기본 정보",
+         "fields": ["company_name", "department", "investigator_name", "investigation_date"]},
+        {"id": "work_environment", "title": "작업환경 평가",
+         "fields": ["work_posture", "repetitive_motion"]}
+    ],
+    "fields": [
+        {"id": "company_name", "type": "text", "required": True, "label": "회사명"},
+        {"id": "department", "type": "text", "required": True, "label": "부서명"},
+        {"id": "investigator_name", "type": "text", "required": True, "label": "조사자명"},
+        {"id": "investigation_date", "type": "date", "required": True, "label": "조사일자"},
+        {"id": "work_posture", "type": "select", "required": True, "label": "작업자세 평가",
+         "options": ["양호", "보통", "위험", "매우위험"]},
+        {"id": "repetitive_motion", "type": "select", "required": True, "label": "반복동작 평가",
+         "options": ["낮음", "보통", "높음", "매우높음"]}
+    ]
+}
+
+
+class MockWorkerHandler(BaseHTTPRequestHandler):
+    """Request handler; state lives on the server (kv, latency, jitter)"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real edge
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def simulate_latency(self):
+        latency = self.server.latency + random.uniform(0, self.server.jitter)
+        if latency:
+            time.sleep(latency / 1000)
+
+    def do_GET(self):
+        self.simulate_latency()
+        match = re.fullmatch(r"/api/excel/form-structure/([^/?]+)(\?.*)?", self.path)
+        if not match:
+            return self.send_json(404, {"error": "Not found"})
+
+        structure = self.server.kv.get(f"form_{match.group(1)}")
+        if structure is None and match.group(1) == FORM_ID:
+            structure = self.server.kv.setdefault(f"form_{FORM_ID}", DEFAULT_STRUCTURE)
+        if structure is None:
+            return self.send_json(404, {"error": "Form structure not found"})
+        self.send_json(200, structure)
+
+    def do_POST(self):
+        self.simulate_latency()
+        try:
+            body = self.read_json()
+        except ValueError:
+            return self.send_json(400, {"error": "Invalid JSON"})
+
+        if self.path == "/api/excel/process-excel":
+            structure = body.get("structure")
+            if structure is None:
+                if not body.get("fileData") or body.get("fileName") != f"{FORM_ID}.xls":
+                    return self.send_json(400, {"error": "Invalid file or filename"})
+                structure = DEFAULT_STRUCTURE
+            elif not self.headers.get("Authorization", "").startswith("Bearer "):
+                return self.send_json(401, {"error": "Unauthorized"})
+            elif (structure.get("formId") != FORM_ID or not isinstance(structure.get("fields"), list)
+                  or not isinstance(structure.get("sections"), list)):
+                return self.send_json(400, {"error": "Invalid survey structure"})
+
+            self.server.kv[f"form_{FORM_ID}"] = structure
+            return self.send_json(200, {
+                "success": True,
+                "message": "Excel file processed successfully",
+                "surveyId": FORM_ID,
+                "fieldsCount": len(structure["fields"]),
+                "sections": len(structure["sections"])
+            })
+
+        if self.path == "/api/excel/export-to-excel":
+            if body.get("formType") != FORM_ID:
+                return self.send_json(400, {"error": "Unsupported form type"})
+            file_format = body.get("format", "xlsx")
+            file_id = f"export_{int(time.time() * 1000)}_{uuid.uuid4().hex[:9]}"
+            self.server.kv[f"excel_export_{file_id}"] = body.get("responses", [])
+            return self.send_json(200, {
+                "success": True,
+                "fileId": file_id,
+                "downloadUrl": f"/api/excel/download/{file_id}",
+                "fileName": f"002_survey_responses_{datetime.now().strftime('%Y-%m-%d')}.{file_format}"
+            })
+
+        if self.path == "/api/excel/validate-excel":
+            expected = body.get("expectedFields") or []
+            known = {field["id"] for field in DEFAULT_STRUCTURE["fields"]}
+            missing = [field for field in expected if field not in known]
+            return self.send_json(200, {
+                "isValid": not missing,
+                "errors": [f"Missing field: {field}" for field in missing],
+                "warnings": [],
+                "fieldMapping": {field: field for field in expected if field in known}
+            })
+
+        self.send_json(404, {"error": "Not found"})
+
+
+def start_mock_server(port=0, latency=0.0, jitter=0.0):
+    """Serve the mock on a background thread; returns the server (server.server_port)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockWorkerHandler)
+    server.daemon_threads = True
+    server.kv = {}
+    server.latency = latency
+    server.jitter = jitter
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the SafeWork Excel Worker")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency per request in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency per request, up to this many ms")
+    args = parser.parse_args()
+
+    server = start_mock_server(args.port, args.latency, args.jitter)
+    print(f"🧪 Mock Excel Worker listening on http://127.0.0.1:{server.server_port}/api/excel")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
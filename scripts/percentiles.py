@@ -0,0 +1,13 @@
+"""
+Nearest-rank percentiles shared by the sync metrics and the worker benchmark
+"""
+
+import math
+
+
+def nearest_rank(sorted_values, fraction):
+    """Smallest value with at least `fraction` of the ascending list at or below it"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
@@ -4,13 +4,31 @@
 Migrates data from PostgreSQL to Cloudflare D1 database
 """
 
+import io
 import os
+import re
 import sys
+import gzip
 import json
+import time
+import random
+import select
+import signal
+import argparse
+import sqlite3
+import calendar
+import hashlib
+import tempfile
+import threading
 import subprocess
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from percentiles import nearest_rank
 
 # Database configuration
 POSTGRES_CONFIG = {
@@ -24,6 +42,101 @@
 D1_DATABASE_ID = 'd1db1d92-f598-415e-910f-1af511bc182f'
 D1_DATABASE_NAME = 'PRIMARY_DB'
 
+# D1 backend: 'wrangler' (default), 'http' (D1 query API) or 'sqlite' (local stand-in)
+D1_BACKEND = os.getenv('D1_BACKEND', 'wrangler')
+CLOUDFLARE_ACCOUNT_ID = os.getenv('CLOUDFLARE_ACCOUNT_ID', 'a8d9c67f586acdd15eebcc65ca3aa5bb')
+CLOUDFLARE_API_TOKEN = os.getenv('CLOUDFLARE_API_TOKEN', '')
+D1_API_URL = 'https://api.cloudflare.com/client/v4/accounts/{account_id}/d1/database/{database_id}/query'
+D1_SQLITE_PATH = os.getenv('D1_SQLITE_PATH', 'd1_local.sqlite')
+WORKERS_DIR = os.getenv('WORKERS_DIR', '/home/jclee/app/safework/workers')
+
+# Incremental sync state (per-table updated_at/id high-water marks)
+SYNC_STATE_FILE = os.getenv(
+    'SYNC_STATE_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.d1_sync_state.json')
+)
+
+# Rows fetched per server-side cursor round trip
+STREAM_ITERSIZE = int(os.getenv('SYNC_ITERSIZE', '2000'))
+
+# D1 caps a single SQL statement at 100 KB; batches group several statements
+# into one execute_d1_command call and are bounded by total size instead
+D1_MAX_STATEMENT_BYTES = 100_000
+D1_MAX_BOUND_PARAMETERS = 100
+D1_MAX_BATCH_BYTES = int(os.getenv('SYNC_BATCH_BYTES', '1000000'))
+
+# Survey batches sent to D1 at the same time
+SYNC_CONCURRENCY = int(os.getenv('SYNC_CONCURRENCY', '4'))
+
+# Tables synced at the same time, each on its own pooled Postgres connection.
+# A table only starts once the tables it references (FK parents) are loaded.
+SYNC_TABLE_WORKERS = int(os.getenv('SYNC_TABLE_WORKERS', '4'))
+SYNC_DEPENDENCIES = {
+    'users': [],
+    'companies': [],
+    'processes': [],
+    'roles': [],
+    'surveys': ['users', 'companies', 'processes', 'roles'],
+}
+
+# Keyset-paginated full survey sync checkpoint (last id of the last committed page)
+SYNC_CHECKPOINT_FILE = os.getenv(
+    'SYNC_CHECKPOINT_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.d1_sync_checkpoint.json')
+)
+SURVEY_PAGE_SIZE = 1000
+
+# Content hashes of the rows last pushed to D1, for --skip-unchanged
+SYNC_FINGERPRINT_DB = os.getenv(
+    'SYNC_FINGERPRINT_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.d1_sync_fingerprints.sqlite')
+)
+FINGERPRINT_LOOKUP_SIZE = 500
+
+# Transient D1 failures are retried with capped exponential backoff and full
+# jitter; rows that still fail on their own land in a replayable JSONL file
+SYNC_RETRIES = int(os.getenv('SYNC_RETRIES', '4'))
+SYNC_RETRY_BASE_DELAY = float(os.getenv('SYNC_RETRY_BASE_DELAY', '1.0'))
+SYNC_RETRY_MAX_DELAY = 30.0
+SYNC_DEAD_LETTER_FILE = os.getenv(
+    'SYNC_DEAD_LETTER_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'd1_sync_dead_letters.jsonl')
+)
+# --daemon: row changes arrive over LISTEN/NOTIFY from per-table triggers and
+# are applied in micro-batches, at most SYNC_DAEMON_MAX_LATENCY seconds after
+# the first change of a batch or as soon as SYNC_DAEMON_BATCH_ROWS are pending
+SYNC_NOTIFY_CHANNEL = 'safework_d1_sync'
+SYNC_DAEMON_MAX_LATENCY = float(os.getenv('SYNC_DAEMON_MAX_LATENCY', '2.0'))
+SYNC_DAEMON_BATCH_ROWS = int(os.getenv('SYNC_DAEMON_BATCH_ROWS', '500'))
+D1_DELETE_CHUNK_SIZE = 1000
+
+# Ids read from D1 per keyset page when reconciling deletes (--prune-deleted)
+D1_KEY_PAGE_SIZE = 10000
+
+# --verify compares checksums of 10k-id ranges, then 100-id buckets inside
+# mismatched ranges, then single rows inside mismatched buckets
+VERIFY_RANGE_SIZE = 10000
+VERIFY_SUBRANGE_SIZE = 100
+
+# Rows per compressed JSONL file written by --export-snapshot
+SNAPSHOT_CHUNK_ROWS = int(os.getenv('SYNC_SNAPSHOT_CHUNK_ROWS', '50000'))
+
+TRANSIENT_ERROR_PATTERN = re.compile(
+    r'timed? ?out|rate limit|too many requests|econnreset|econnrefused|fetch failed|'
+    r'network|temporarily|unavailable|overloaded|database is locked|'
+    r'(status|code)\D{0,3}(429|5\d\d)\b',
+    re.IGNORECASE
+)
+
+# Errors no single row can cause: bad credentials or a D1 schema/config mismatch.
+# Bisecting these would dead-letter every row, so they fail the sync instead
+FATAL_ERROR_PATTERN = re.compile(
+    r'authenticat|unauthori[sz]ed|forbidden|invalid (api )?token|not logged in|'
+    r'could not (find|route to) .*database|no such table|has no column named|'
+    r'(status|code)\D{0,3}(401|403)\b',
+    re.IGNORECASE
+)
+
 
 def connect_postgres():
     """Connect to PostgreSQL database"""
@@ -36,283 +149,1994 @@ def connect_postgres():
         sys.exit(1)
 
 
-def execute_d1_command(sql_command):
-    """Execute SQL command on D1 database"""
+def connect_postgres_pool(max_connections=SYNC_TABLE_WORKERS):
+    """Open a thread-safe PostgreSQL connection pool"""
+    try:
+        pool = ThreadedConnectionPool(1, max(1, max_connections), **POSTGRES_CONFIG)
+        print(f"✅ Connected to PostgreSQL: {POSTGRES_CONFIG['database']} (pool of {max_connections})")
+        return pool
+    except Exception as e:
+        print(f"❌ Failed to connect to PostgreSQL: {e}")
+        sys.exit(1)
+
+
+def run_with_pooled_connection(pool, task):
+    """Run task(conn) on a connection borrowed from the pool"""
+    conn = pool.getconn()
     try:
-        # Write SQL to temp file
-        temp_file = '/tmp/d1_sync_temp.sql'
-        with open(temp_file, 'w') as f:
-            f.write(sql_command)
+        return task(conn)
+    finally:
+        # Close any open read transaction before handing the connection back
+        conn.rollback()
+        pool.putconn(conn)
+
+
+def run_sync_graph(pool, tasks, dependencies=SYNC_DEPENDENCIES, max_workers=SYNC_TABLE_WORKERS):
+    """Run per-table sync tasks in parallel, each once its FK parents are loaded
+
+    tasks maps table name to a callable taking a Postgres connection. A task
+    whose parent failed is not started. Raises once every runnable task has
+    finished if any of them failed.
+    """
+    pending = dict(tasks)
+    running = {}
+    done, failed = set(), {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while pending or running:
+            for table in list(pending):
+                parents = [parent for parent in dependencies.get(table, []) if parent in tasks]
+                if any(parent in failed for parent in parents):
+                    failed[table] = Exception("skipped because a parent table failed")
+                    del pending[table]
+                elif all(parent in done for parent in parents):
+                    future = executor.submit(run_with_pooled_connection, pool, pending.pop(table))
+                    running[future] = table
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table = running.pop(future)
+                try:
+                    future.result()
+                    done.add(table)
+                except Exception as e:
+                    failed[table] = e
+                    print(f"   ❌ {table} sync failed: {e}")
+
+    if failed:
+        raise Exception("; ".join(f"{table}: {error}" for table, error in failed.items()))
+
+
+class SyncMetrics:
+    """Thread-safe per-table timings and counters for one sync run
+
+    Phases are 'fetch' (Postgres), 'fingerprint', 'encode' and 'd1'
+    (wall time spent in D1 calls, retries included). Every successful D1
+    batch also records its row count, payload bytes and latency.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.tables = {}
+
+    def _table(self, table):
+        if table not in self.tables:
+            self.tables[table] = {
+                'rows': 0, 'bytes_sent': 0, 'batches': 0, 'failed_calls': 0,
+                'phases': {'fetch': 0.0, 'fingerprint': 0.0, 'encode': 0.0, 'd1': 0.0},
+                'batch_latencies': [],
+                'first_seen': time.perf_counter(),
+                'last_seen': time.perf_counter()
+            }
+        return self.tables[table]
+
+    def start_table(self, table):
+        """Mark the start of a table's sync, for its wall-clock rows/sec"""
+        with self.lock:
+            self._table(table)['first_seen'] = time.perf_counter()
+
+    def add_time(self, table, phase, seconds):
+        with self.lock:
+            stats = self._table(table)
+            stats['phases'][phase] += seconds
+            stats['last_seen'] = time.perf_counter()
+
+    def record_batch(self, table, rows, payload_bytes, seconds):
+        with self.lock:
+            stats = self._table(table)
+            stats['rows'] += rows
+            stats['bytes_sent'] += payload_bytes
+            stats['batches'] += 1
+            stats['phases']['d1'] += seconds
+            stats['batch_latencies'].append(seconds)
+            stats['last_seen'] = time.perf_counter()
+
+    def record_failure(self, table, seconds):
+        with self.lock:
+            stats = self._table(table)
+            stats['failed_calls'] += 1
+            stats['phases']['d1'] += seconds
+            stats['last_seen'] = time.perf_counter()
+
+    @staticmethod
+    def percentile(values, fraction):
+        """Nearest-rank percentile of a list of numbers"""
+        return nearest_rank(sorted(values), fraction)
+
+    def report(self, success=True, options=None):
+        """Build the machine-readable run report"""
+        with self.lock:
+            tables = {}
+            for table, stats in self.tables.items():
+                elapsed = max(stats['last_seen'] - stats['first_seen'], 1e-9)
+                latencies = stats['batch_latencies']
+                tables[table] = {
+                    'rows': stats['rows'],
+                    'bytes_sent': stats['bytes_sent'],
+                    'batches': stats['batches'],
+                    'failed_calls': stats['failed_calls'],
+                    'seconds': round(elapsed, 6),
+                    'rows_per_second': round(stats['rows'] / elapsed, 2),
+                    'phase_seconds': {phase: round(value, 6) for phase, value in stats['phases'].items()},
+                    'batch_latency_seconds': {
+                        'p50': round(self.percentile(latencies, 0.50), 6),
+                        'p95': round(self.percentile(latencies, 0.95), 6),
+                        'max': round(max(latencies), 6) if latencies else 0.0
+                    }
+                }
+
+        duration = time.perf_counter() - self.started
+        total_rows = sum(stats['rows'] for stats in tables.values())
+        return {
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.now().isoformat(),
+            'duration_seconds': round(duration, 6),
+            'success': success,
+            'rows': total_rows,
+            'bytes_sent': sum(stats['bytes_sent'] for stats in tables.values()),
+            'rows_per_second': round(total_rows / max(duration, 1e-9), 2),
+            'options': options or {},
+            'tables': tables
+        }
+
+
+def write_run_report(report, path):
+    """Write the JSON run report"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def write_prometheus_textfile(report, path):
+    """Write the run report in node_exporter textfile-collector format"""
+    prefix = 'safework_d1_sync'
+    lines = [
+        f"# HELP {prefix}_last_run_timestamp_seconds Unix time the last sync run finished.",
+        f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+        f"{prefix}_last_run_timestamp_seconds {time.time():.0f}",
+        f"# HELP {prefix}_last_run_success Whether the last sync run succeeded.",
+        f"# TYPE {prefix}_last_run_success gauge",
+        f"{prefix}_last_run_success {1 if report['success'] else 0}",
+        f"# HELP {prefix}_duration_seconds Wall-clock duration of the last sync run.",
+        f"# TYPE {prefix}_duration_seconds gauge",
+        f"{prefix}_duration_seconds {report['duration_seconds']}",
+    ]
+
+    per_table = [
+        ('rows', 'Rows pushed to D1 by the last run.', lambda s: s['rows']),
+        ('bytes_sent', 'SQL payload bytes sent to D1 by the last run.', lambda s: s['bytes_sent']),
+        ('batches', 'D1 batches sent by the last run.', lambda s: s['batches']),
+        ('failed_calls', 'Failed D1 calls in the last run.', lambda s: s['failed_calls']),
+        ('rows_per_second', 'Rows pushed per second in the last run.', lambda s: s['rows_per_second']),
+    ]
+    for name, help_text, value in per_table:
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        for table, stats in report['tables'].items():
+            lines.append(f'{prefix}_{name}{{table="{table}"}} {value(stats)}')
+
+    lines.append(f"# HELP {prefix}_phase_seconds Time spent per sync phase in the last run.")
+    lines.append(f"# TYPE {prefix}_phase_seconds gauge")
+    for table, stats in report['tables'].items():
+        for phase, seconds in stats['phase_seconds'].items():
+            lines.append(f'{prefix}_phase_seconds{{table="{table}",phase="{phase}"}} {seconds}')
+
+    lines.append(f"# HELP {prefix}_batch_latency_seconds D1 batch latency quantiles in the last run.")
+    lines.append(f"# TYPE {prefix}_batch_latency_seconds gauge")
+    for table, stats in report['tables'].items():
+        for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('1', 'max')):
+            lines.append(f'{prefix}_batch_latency_seconds{{table="{table}",quantile="{quantile}"}} '
+                         f"{stats['batch_latency_seconds'][key]}")
+
+    # Write then rename so the collector never reads a half-written file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(temp_path, path)
+
+
+def print_run_summary(report):
+    """Print the per-table throughput summary"""
+    print("\n📈 Sync performance:")
+    for table, stats in report['tables'].items():
+        phases = stats['phase_seconds']
+        latency = stats['batch_latency_seconds']
+        print(f"   {table}: {stats['rows']} rows, {stats['bytes_sent'] / 1024:.1f} KiB, "
+              f"{stats['rows_per_second']} rows/s | fetch {phases['fetch']:.2f}s, "
+              f"encode {phases['encode']:.2f}s, d1 {phases['d1']:.2f}s | "
+              f"batch p50 {latency['p50'] * 1000:.0f}ms, p95 {latency['p95'] * 1000:.0f}ms")
+
+
+_metrics = SyncMetrics()
+
+
+def get_sync_metrics():
+    """Return the metrics collector for the current run"""
+    return _metrics
+
+
+class D1CommandError(Exception):
+    """A failed D1 call; transient ones are worth retrying unchanged, fatal ones never succeed"""
+
+    def __init__(self, message, transient=False, fatal=None):
+        super().__init__(message)
+        self.transient = transient
+        self.fatal = is_fatal_error(message) if fatal is None else fatal
+
+
+def is_transient_error(message):
+    """Guess from an error message whether retrying the same SQL can succeed"""
+    return bool(TRANSIENT_ERROR_PATTERN.search(message or ''))
+
+
+def is_fatal_error(message):
+    """Guess from an error message whether it comes from auth or config rather than the rows"""
+    return bool(FATAL_ERROR_PATTERN.search(message or ''))
+
+
+class WranglerD1Backend:
+    """Runs SQL through `wrangler d1 execute --file` (one subprocess per call)"""
+
+    name = 'wrangler'
+    bind_params = False
+
+    def __init__(self, database_name=D1_DATABASE_NAME, cwd=WORKERS_DIR):
+        self.database_name = database_name
+        self.cwd = cwd
+
+    def execute(self, sql_command, params=None):
+        if params:
+            raise ValueError("wrangler backend only executes literal SQL")
+
+        temp_file = None
+        try:
+            # Write SQL to its own temp file, so batches can run concurrently
+            fd, temp_file = tempfile.mkstemp(prefix='d1_sync_', suffix='.sql')
+            with os.fdopen(fd, 'w') as f:
+                f.write(sql_command)
+
+            cmd = [
+                'wrangler', 'd1', 'execute', self.database_name,
+                '--file', temp_file,
+                '--env', 'production'
+            ]
+
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                cwd=self.cwd
+            )
+
+            if result.returncode != 0:
+                raise D1CommandError(f"D1 command failed: {result.stderr}",
+                                     transient=is_transient_error(result.stderr))
+
+            return result.stdout
+        finally:
+            if temp_file and os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def query(self, sql_command, params=None):
+        if params:
+            raise ValueError("wrangler backend only executes literal SQL")
 
-        # Execute via wrangler
         cmd = [
-            'wrangler', 'd1', 'execute', D1_DATABASE_NAME,
-            '--file', temp_file,
+            'wrangler', 'd1', 'execute', self.database_name,
+            '--command', sql_command,
+            '--json',
             '--env', 'production'
         ]
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd='/home/jclee/app/safework/workers'
-        )
+        result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.cwd)
+        if result.returncode != 0:
+            raise D1CommandError(f"D1 query failed: {result.stderr}",
+                                 transient=is_transient_error(result.stderr))
 
-        # Clean up temp file
-        os.remove(temp_file)
+        return json.loads(result.stdout)[0].get('results') or []
 
-        if result.returncode != 0:
-            raise Exception(f"D1 command failed: {result.stderr}")
+    def close(self):
+        pass
+
+
+class HttpD1Backend:
+    """Posts SQL to the D1 query API over a pooled keep-alive requests.Session"""
+
+    name = 'http'
+
+    def __init__(self, account_id=CLOUDFLARE_ACCOUNT_ID, database_id=D1_DATABASE_ID,
+                 api_token=CLOUDFLARE_API_TOKEN, pool_size=SYNC_CONCURRENCY, timeout=60,
+                 bind_params=True):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        if not api_token:
+            raise ValueError("CLOUDFLARE_API_TOKEN is required for the http backend")
+
+        self.url = D1_API_URL.format(account_id=account_id, database_id=database_id)
+        self.bind_params = bind_params
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f"Bearer {api_token}",
+            'Content-Type': 'application/json'
+        })
+        # One keep-alive connection per worker thread
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount('https://', adapter)
+
+    def execute(self, sql_command, params=None):
+        return self.post({'sql': sql_command, 'params': list(params or [])})
+
+    def execute_batch(self, statements):
+        """Send every (sql, params) statement in one request, applied as one batch"""
+        return self.post({'batch': [{'sql': sql, 'params': list(params or [])} for sql, params in statements]})
+
+    def post(self, payload):
+        import requests
+
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise D1CommandError(f"D1 request failed: {e}", transient=True)
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+
+        if response.status_code != 200 or not body.get('success'):
+            errors = body.get('errors') or response.text
+            transient = response.status_code == 429 or response.status_code >= 500
+            raise D1CommandError(f"D1 command failed ({response.status_code}): {errors}",
+                                 transient=transient or is_transient_error(str(errors)),
+                                 fatal=response.status_code in (401, 403) or None)
+
+        return body.get('result')
+
+    def query(self, sql_command, params=None):
+        result = self.execute(sql_command, params)
+        return (result or [{}])[0].get('results') or []
+
+    def close(self):
+        self.session.close()
+
+
+class SQLiteD1Backend:
+    """Local stand-in that applies the same SQL to a SQLite file, for testing"""
 
-        return result.stdout
+    name = 'sqlite'
+
+    def __init__(self, path=D1_SQLITE_PATH, bind_params=False):
+        self.path = path
+        self.bind_params = bind_params
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def execute(self, sql_command, params=None):
+        with self.lock:
+            try:
+                if params:
+                    rows = self.conn.execute(sql_command, list(params)).fetchall()
+                else:
+                    self.conn.executescript(sql_command)
+                    rows = []
+                self.conn.commit()
+                return rows
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise D1CommandError(f"D1 command failed: {e}", transient=is_transient_error(str(e)))
+
+    def execute_batch(self, statements):
+        """Apply every (sql, params) statement in one transaction"""
+        with self.lock:
+            try:
+                for sql, params in statements:
+                    self.conn.execute(sql, list(params or []))
+                self.conn.commit()
+                return []
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise D1CommandError(f"D1 command failed: {e}", transient=is_transient_error(str(e)))
+
+    def query(self, sql_command, params=None):
+        with self.lock:
+            try:
+                cursor = self.conn.execute(sql_command, list(params or []))
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            except sqlite3.Error as e:
+                raise D1CommandError(f"D1 query failed: {e}", transient=is_transient_error(str(e)))
+
+    def close(self):
+        self.conn.close()
+
+
+D1_BACKENDS = {
+    'wrangler': WranglerD1Backend,
+    'http': HttpD1Backend,
+    'sqlite': SQLiteD1Backend,
+}
+
+_d1_backend = None
+
+
+def set_d1_backend(backend):
+    """Route execute_d1_command through the given backend instance"""
+    global _d1_backend
+    _d1_backend = backend
+
+
+def create_d1_backend(name=D1_BACKEND, **options):
+    """Instantiate a D1 backend by name"""
+    if name not in D1_BACKENDS:
+        raise ValueError(f"Unknown D1 backend: {name} (choose from {', '.join(D1_BACKENDS)})")
+    return D1_BACKENDS[name](**options)
+
+
+def get_d1_backend():
+    """Return the configured backend, creating the default one on first use"""
+    global _d1_backend
+    if _d1_backend is None:
+        _d1_backend = create_d1_backend()
+    return _d1_backend
+
+
+def execute_d1_command(sql_command, params=None):
+    """Execute SQL command on D1 database through the configured backend"""
+    try:
+        return get_d1_backend().execute(sql_command, params)
     except Exception as e:
         print(f"❌ D1 execution error: {e}")
         raise
 
 
-def sync_users(conn):
-    """Sync users table"""
-    print("\n📊 Syncing users table...")
-
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT * FROM users")
-    users = cursor.fetchall()
-
-    print(f"   Found {len(users)} users")
-
-    sql_commands = []
-    for user in users:
-        sql = f"""
-        INSERT OR REPLACE INTO users (
-            id, username, email, password_hash, is_admin, is_active,
-            last_login, created_at, updated_at
-        ) VALUES (
-            {user['id']},
-            '{user['username']}',
-            '{user['email']}',
-            '{user['password_hash']}',
-            {1 if user['is_admin'] else 0},
-            {1 if user['is_active'] else 0},
-            {f"'{user['last_login']}'" if user['last_login'] else 'NULL'},
-            '{user['created_at']}',
-            '{user['updated_at']}'
-        );
-        """
-        sql_commands.append(sql)
+def query_d1(sql_command, params=None, retries=SYNC_RETRIES, base_delay=SYNC_RETRY_BASE_DELAY):
+    """Run a read-only query on D1 and return its rows as dicts, retrying transient errors"""
+    for attempt in range(retries + 1):
+        try:
+            return get_d1_backend().query(sql_command, params)
+        except D1CommandError as e:
+            if not e.transient or attempt == retries:
+                raise
+            delay = random.uniform(0, min(SYNC_RETRY_MAX_DELAY, base_delay * 2 ** attempt))
+            print(f"   🔁 Transient D1 error, retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
 
-    if sql_commands:
-        execute_d1_command('\n'.join(sql_commands))
-        print(f"   ✅ Synced {len(users)} users")
 
-    cursor.close()
+def execute_d1_statements(statements):
+    """Execute a batch of (sql, params) statements in a single D1 call"""
+    if not any(params for _, params in statements):
+        return execute_d1_command('\n'.join(sql for sql, _ in statements))
 
+    try:
+        return get_d1_backend().execute_batch(statements)
+    except Exception as e:
+        print(f"❌ D1 execution error: {e}")
+        raise
 
-def sync_companies(conn):
-    """Sync companies table"""
-    print("\n📊 Syncing companies table...")
-
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT * FROM companies ORDER BY id")
-    companies = cursor.fetchall()
-
-    print(f"   Found {len(companies)} companies")
-
-    sql_commands = []
-    for company in companies:
-        sql = f"""
-        INSERT OR REPLACE INTO companies (
-            id, name, is_active, display_order, created_at, updated_at
-        ) VALUES (
-            {company['id']},
-            '{company['name']}',
-            {1 if company['is_active'] else 0},
-            {company['display_order']},
-            '{company['created_at']}',
-            '{company['updated_at']}'
-        );
-        """
-        sql_commands.append(sql)
 
-    if sql_commands:
-        execute_d1_command('\n'.join(sql_commands))
-        print(f"   ✅ Synced {len(companies)} companies")
+def execute_with_retry(statements, retries=SYNC_RETRIES, base_delay=SYNC_RETRY_BASE_DELAY):
+    """Execute statements, retrying transient D1 errors with backoff and jitter"""
+    for attempt in range(retries + 1):
+        try:
+            return execute_d1_statements(statements)
+        except D1CommandError as e:
+            if not e.transient or attempt == retries:
+                raise
+            delay = random.uniform(0, min(SYNC_RETRY_MAX_DELAY, base_delay * 2 ** attempt))
+            print(f"   🔁 Transient D1 error, retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
 
-    cursor.close()
 
+class DeadLetterLog:
+    """Append-only JSONL file of rows D1 rejected, replayable with --replay-dead-letters"""
 
-def sync_processes(conn):
-    """Sync processes table"""
-    print("\n📊 Syncing processes table...")
-
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT * FROM processes ORDER BY id")
-    processes = cursor.fetchall()
-
-    print(f"   Found {len(processes)} processes")
-
-    sql_commands = []
-    for process in processes:
-        description = process.get('description', '')
-        if description:
-            description = description.replace("'", "''")  # Escape single quotes
-
-        sql = f"""
-        INSERT OR REPLACE INTO processes (
-            id, name, description, is_active, display_order, created_at, updated_at
-        ) VALUES (
-            {process['id']},
-            '{process['name']}',
-            '{description}',
-            {1 if process['is_active'] else 0},
-            {process['display_order']},
-            '{process['created_at']}',
-            '{process['updated_at']}'
-        );
-        """
-        sql_commands.append(sql)
+    def __init__(self, path=SYNC_DEAD_LETTER_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
 
-    if sql_commands:
-        execute_d1_command('\n'.join(sql_commands))
-        print(f"   ✅ Synced {len(processes)} processes")
+    def write(self, table, row, error):
+        encoder = get_row_encoder(table)
+        entry = {
+            'table': table,
+            'id': row.get('id'),
+            'values': dict(zip(encoder.columns, encoder.values(row))),
+            'error': str(error),
+            'failed_at': datetime.now().isoformat()
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self.count += 1
+        print(f"   ☠️ Dead-lettered {table} row {entry['id']}: {error}")
 
-    cursor.close()
 
+_dead_letters = None
 
-def sync_roles(conn):
-    """Sync roles table"""
-    print("\n📊 Syncing roles table...")
-
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT * FROM roles ORDER BY id")
-    roles = cursor.fetchall()
-
-    print(f"   Found {len(roles)} roles")
-
-    sql_commands = []
-    for role in roles:
-        description = role.get('description', '')
-        if description:
-            description = description.replace("'", "''")
-
-        sql = f"""
-        INSERT OR REPLACE INTO roles (
-            id, title, description, is_active, display_order, created_at, updated_at
-        ) VALUES (
-            {role['id']},
-            '{role['title']}',
-            '{description}',
-            {1 if role['is_active'] else 0},
-            {role['display_order']},
-            '{role['created_at']}',
-            '{role['updated_at']}'
-        );
+
+def set_dead_letter_log(log):
+    """Route rejected rows to the given DeadLetterLog"""
+    global _dead_letters
+    _dead_letters = log
+
+
+def get_dead_letter_log():
+    """Return the configured DeadLetterLog, creating the default one on first use"""
+    global _dead_letters
+    if _dead_letters is None:
+        _dead_letters = DeadLetterLog()
+    return _dead_letters
+
+
+def try_push_batch(table, statements, rows):
+    """Push one batch with transient retries; returns the D1CommandError if it was rejected"""
+    started = time.perf_counter()
+    try:
+        execute_with_retry(statements)
+    except D1CommandError as e:
+        _metrics.record_failure(table, time.perf_counter() - started)
+        if e.transient or e.fatal:
+            raise
+        return e
+    payload_bytes = sum(len(sql.encode('utf-8')) + len(json.dumps(params, default=str))
+                        if params else len(sql.encode('utf-8'))
+                        for sql, params in statements)
+    _metrics.record_batch(table, len(rows), payload_bytes, time.perf_counter() - started)
+    return None
+
+
+def push_batch(table, statements, rows, error=None):
+    """Push one batch, retrying transient errors and bisecting permanent ones
+
+    A batch that D1 rejects outright is split in half and re-encoded until
+    the offending rows are isolated; those go to the dead-letter log so the
+    rest of the batch still lands. Returns the rows that reached D1.
+
+    Raises D1CommandError when D1 keeps failing transiently and on fatal
+    (auth/config) errors, which no split can fix. error is the rejection
+    already seen for this batch, to avoid sending it twice.
+    """
+    if error is None:
+        error = try_push_batch(table, statements, rows)
+        if error is None:
+            return rows
+    if len(rows) == 1:
+        get_dead_letter_log().write(table, rows[0], error)
+        return []
+
+    middle = len(rows) // 2
+    pushed = []
+    for half in (rows[:middle], rows[middle:]):
+        for half_statements, half_rows in iter_insert_batches(table, half, get_d1_backend().bind_params):
+            pushed.extend(push_batch(table, half_statements, half_rows))
+    return pushed
+
+
+def execute_d1_batches(table, batches, concurrency=SYNC_CONCURRENCY):
+    """Run (statements, rows) batches through push_batch on a bounded thread pool
+
+    Yields (batch_number, rows, pushed, error) in submission order, where
+    pushed is the subset of rows that reached D1 (the rest were
+    dead-lettered) and error is set when the batch failed as a whole, so
+    callers can keep contiguous-success bookkeeping. At most 2 x concurrency
+    batches are built ahead of the slowest in-flight one.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        pending = deque()
+
+        def finish():
+            batch_number, rows, future = pending.popleft()
+            try:
+                return batch_number, rows, future.result(), None
+            except Exception as e:
+                return batch_number, rows, [], e
+
+        for batch_number, (statements, rows) in enumerate(batches, start=1):
+            pending.append((batch_number, rows, pool.submit(push_batch, table, statements, rows)))
+            if len(pending) >= 2 * max(1, concurrency):
+                yield finish()
+
+        while pending:
+            yield finish()
+
+
+def load_sync_state(path=SYNC_STATE_FILE):
+    """Load per-table watermarks from the local state file"""
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable sync state {path}: {e}")
+        return {}
+
+
+def save_sync_state(state, path=SYNC_STATE_FILE):
+    """Atomically persist per-table watermarks to the local state file"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def build_changed_rows_query(table, state=None, order_by='id', limit=None):
+    """Build the SELECT for a table, only rows past its watermark when state is given
+
+    Incremental selects walk (updated_at, id) in ascending order so that a
+    capped or interrupted run never skips rows below the new watermark.
+    """
+    if state is None:
+        query = f"SELECT * FROM {table} ORDER BY {order_by}"
+        params = []
+    elif table in state:
+        query = f"""
+            SELECT * FROM {table}
+            WHERE (updated_at, id) > (%s, %s)
+            ORDER BY updated_at, id
         """
-        sql_commands.append(sql)
+        params = [state[table]['updated_at'], state[table]['id']]
+    else:
+        query = f"SELECT * FROM {table} ORDER BY updated_at, id"
+        params = []
+
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+
+    return query, params
+
+
+def stream_rows(conn, query, params=None, name='sync_cursor', itersize=STREAM_ITERSIZE, table=None):
+    """Yield rows through a named (server-side) cursor, `itersize` rows per round trip
+
+    Time spent waiting on Postgres is charged to the table's 'fetch' phase.
+    """
+    cursor = conn.cursor(name=name, cursor_factory=RealDictCursor)
+    cursor.itersize = itersize
+    fetch_seconds = 0.0
+    try:
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        rows = iter(cursor)
+        fetch_seconds += time.perf_counter() - started
+        while True:
+            started = time.perf_counter()
+            row = next(rows, None)
+            fetch_seconds += time.perf_counter() - started
+            if row is None:
+                break
+            yield row
+    finally:
+        _metrics.add_time(table or name, 'fetch', fetch_seconds)
+        cursor.close()
+
+
+def stream_changed_rows(conn, table, state=None, order_by='id', limit=None, itersize=STREAM_ITERSIZE):
+    """Stream the rows of a table that need syncing"""
+    query, params = build_changed_rows_query(table, state, order_by, limit)
+    return stream_rows(conn, query, params, name=f"sync_{table}", itersize=itersize, table=table)
+
+
+def advance_watermark(state, table, rows):
+    """Move a table's watermark to the newest (updated_at, id) seen in rows"""
+    if state is None:
+        return
+
+    current = state.get(table)
+    newest = (current['updated_at'], current['id']) if current else None
+
+    for row in rows:
+        if row.get('updated_at') is None:
+            continue
+        candidate = (row['updated_at'].isoformat(), row['id'])
+        if newest is None or candidate > newest:
+            newest = candidate
+
+    if newest is not None:
+        state[table] = {'updated_at': newest[0], 'id': newest[1]}
+
+
+# Per-table column specs: (column, kind) or (column, kind, default for NULL).
+# Kinds: int, number, bool, text, json, timestamp
+TABLE_SCHEMAS = {
+    'users': [
+        ('id', 'int'), ('username', 'text'), ('email', 'text'), ('password_hash', 'text'),
+        ('is_admin', 'bool'), ('is_active', 'bool'), ('last_login', 'timestamp'),
+        ('created_at', 'timestamp'), ('updated_at', 'timestamp'),
+    ],
+    'companies': [
+        ('id', 'int'), ('name', 'text'), ('is_active', 'bool'), ('display_order', 'int'),
+        ('created_at', 'timestamp'), ('updated_at', 'timestamp'),
+    ],
+    'processes': [
+        ('id', 'int'), ('name', 'text'), ('description', 'text', ''), ('is_active', 'bool'),
+        ('display_order', 'int'), ('created_at', 'timestamp'), ('updated_at', 'timestamp'),
+    ],
+    'roles': [
+        ('id', 'int'), ('title', 'text'), ('description', 'text', ''), ('is_active', 'bool'),
+        ('display_order', 'int'), ('created_at', 'timestamp'), ('updated_at', 'timestamp'),
+    ],
+    'surveys': [
+        ('id', 'int'), ('user_id', 'int'), ('form_type', 'text'),
+        ('name', 'text', ''), ('department', 'text', ''), ('position', 'text'),
+        ('employee_id', 'text'), ('gender', 'text'), ('age', 'int'),
+        ('years_of_service', 'number'), ('employee_number', 'text'),
+        ('work_years', 'int'), ('work_months', 'int'), ('has_symptoms', 'bool'),
+        ('status', 'text'), ('responses', 'json'), ('data', 'json'), ('symptoms_data', 'json'),
+        ('company_id', 'int'), ('process_id', 'int'), ('role_id', 'int'),
+        ('submission_date', 'timestamp'), ('created_at', 'timestamp'), ('updated_at', 'timestamp'),
+    ],
+}
+
+
+def _encode_int(value):
+    return value if isinstance(value, int) else int(value)
+
+
+def _encode_number(value):
+    if isinstance(value, (int, float)):
+        return value
+    return int(value) if value == int(value) else float(value)
+
+
+def _encode_bool(value):
+    return 1 if value else 0
+
+
+def _encode_text(value):
+    return value if isinstance(value, str) else str(value)
+
+
+def _encode_json(value):
+    # psycopg2 already decoded json/jsonb columns; dump once, compactly
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _encode_timestamp(value):
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return str(value)
+
+
+COLUMN_ENCODERS = {
+    'int': _encode_int,
+    'number': _encode_number,
+    'bool': _encode_bool,
+    'text': _encode_text,
+    'json': _encode_json,
+    'timestamp': _encode_timestamp,
+}
+
 
-    if sql_commands:
-        execute_d1_command('\n'.join(sql_commands))
-        print(f"   ✅ Synced {len(roles)} roles")
+class RowEncoder:
+    """Turns psycopg2 rows of one table into D1 values in a single pass"""
 
-    cursor.close()
+    def __init__(self, table):
+        self.table = table
+        self.columns = [spec[0] for spec in TABLE_SCHEMAS[table]]
+        self._specs = []
+        for spec in TABLE_SCHEMAS[table]:
+            column, kind = spec[0], spec[1]
+            default = spec[2] if len(spec) > 2 else (0 if kind == 'bool' else None)
+            self._specs.append((column, COLUMN_ENCODERS[kind], default))
 
+    def values(self, row):
+        """Bound-parameter values for one row, in column order"""
+        values = []
+        for column, encode, default in self._specs:
+            value = row.get(column)
+            values.append(default if value is None else encode(value))
+        return values
 
-def sync_surveys(conn, limit=1000):
-    """Sync surveys table (with limit to avoid timeouts)"""
+    def literal(self, row):
+        """Safely escaped SQL VALUES tuple for one row"""
+        return '(' + ', '.join(sql_literal(value) for value in self.values(row)) + ')'
+
+
+def sql_literal(value):
+    """Render an encoded value as a SQLite literal"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+_row_encoders = {}
+
+
+def get_row_encoder(table):
+    """Return the cached RowEncoder for a table"""
+    if table not in _row_encoders:
+        _row_encoders[table] = RowEncoder(table)
+    return _row_encoders[table]
+
+
+class RowFingerprintCache:
+    """SQLite-backed map of (table, id) to the hash of the row last pushed to D1
+
+    filter_changed() drops rows whose encoded form hashes the same as the last
+    successful push; record() stores the new hashes once a batch has landed.
+    """
+
+    def __init__(self, path=SYNC_FINGERPRINT_DB):
+        self.path = path
+        # Shared by the per-table sync threads; every use holds self.lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS row_fingerprints (
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (table_name, row_id)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+        self._pending = {}
+        self.skipped = 0
+
+    @staticmethod
+    def fingerprint(table, row):
+        encoded = get_row_encoder(table).literal(row)
+        return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+
+    def filter_changed(self, table, rows):
+        """Yield only rows that changed since their last successful push"""
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= FINGERPRINT_LOOKUP_SIZE:
+                yield from self._changed_in_chunk(table, chunk)
+                chunk = []
+        if chunk:
+            yield from self._changed_in_chunk(table, chunk)
+
+    def _changed_in_chunk(self, table, rows):
+        started = time.perf_counter()
+        placeholders = ', '.join('?' * len(rows))
+        with self.lock:
+            known = dict(self.conn.execute(
+                f"SELECT row_id, hash FROM row_fingerprints WHERE table_name = ? AND row_id IN ({placeholders})",
+                [table] + [row['id'] for row in rows]
+            ))
+        changed = []
+        digests = {}
+        for row in rows:
+            digest = self.fingerprint(table, row)
+            if known.get(row['id']) == digest:
+                continue
+            digests[(table, row['id'])] = digest
+            changed.append(row)
+        with self.lock:
+            self._pending.update(digests)
+            self.skipped += len(rows) - len(changed)
+        _metrics.add_time(table, 'fingerprint', time.perf_counter() - started)
+        return changed
+
+    def record(self, table, rows):
+        """Remember the hashes of rows that were just pushed successfully"""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO row_fingerprints (table_name, row_id, hash) VALUES (?, ?, ?)",
+                [(table, row['id'], self._pending.pop((table, row['id'])))
+                 for row in rows if (table, row['id']) in self._pending]
+            )
+            self.conn.commit()
+
+    def forget(self, table, ids):
+        """Drop the hashes of rows deleted from D1"""
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM row_fingerprints WHERE table_name = ? AND row_id = ?",
+                [(table, row_id) for row_id in ids]
+            )
+            self.conn.commit()
+
+    def reset(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM row_fingerprints")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def iter_insert_batches(table, rows, bind_params=False,
+                        max_statement_bytes=D1_MAX_STATEMENT_BYTES,
+                        max_batch_bytes=D1_MAX_BATCH_BYTES):
+    """Pack rows into multi-row INSERT OR REPLACE statements and size-bounded batches
+
+    Rows are appended to a statement's VALUES list until the next one would
+    push it past D1's statement length limit (and, with bind_params, its
+    bound-parameter limit), and statements are grouped until a batch would
+    exceed max_batch_bytes. Yields (statements, rows) pairs, where statements
+    is a list of (sql, params), so callers know exactly which rows each batch
+    carried.
+    """
+    encoder = get_row_encoder(table)
+    prefix = f"INSERT OR REPLACE INTO {table} ({', '.join(encoder.columns)}) VALUES\n"
+    prefix_bytes = len(prefix.encode('utf-8'))
+
+    if bind_params:
+        placeholders = '(' + ', '.join('?' * len(encoder.columns)) + ')'
+        max_statement_rows = max(1, D1_MAX_BOUND_PARAMETERS // len(encoder.columns))
+    else:
+        max_statement_rows = None
+
+    def close_statement():
+        if bind_params:
+            sql = prefix + ',\n'.join([placeholders] * len(values)) + ';'
+            return sql, [value for row_values in values for value in row_values]
+        return prefix + ',\n'.join(values) + ';', []
+
+    statements, batch_bytes, batch_rows = [], 0, []
+    values, statement_bytes = [], prefix_bytes
+    encode_seconds = 0.0
+
+    for row in rows:
+        started = time.perf_counter()
+        if bind_params:
+            encoded = encoder.values(row)
+            encoded_bytes = sum(len(v.encode('utf-8')) if isinstance(v, str) else 8 for v in encoded)
+            encoded_bytes += 3 * len(encoded)
+        else:
+            encoded = encoder.literal(row)
+            encoded_bytes = len(encoded.encode('utf-8')) + 2  # ",\n" separator
+        encode_seconds += time.perf_counter() - started
+
+        # A statement may grow up to D1's limits or the room left in the batch
+        statement_limit = min(max_statement_bytes, max_batch_bytes - batch_bytes)
+        statement_full = max_statement_rows is not None and len(values) >= max_statement_rows
+        if values and (statement_full or statement_bytes + encoded_bytes > statement_limit):
+            statements.append(close_statement())
+            batch_bytes += statement_bytes + 1
+            values, statement_bytes = [], prefix_bytes
+
+            # Close the batch before starting a statement that would overflow it
+            if batch_bytes + prefix_bytes + encoded_bytes > max_batch_bytes:
+                _metrics.add_time(table, 'encode', encode_seconds)
+                encode_seconds = 0.0
+                yield statements, batch_rows
+                statements, batch_bytes, batch_rows = [], 0, []
+
+        values.append(encoded)
+        statement_bytes += encoded_bytes
+        batch_rows.append(row)
+
+    if values:
+        statements.append(close_statement())
+    _metrics.add_time(table, 'encode', encode_seconds)
+    if statements:
+        yield statements, batch_rows
+
+
+def sync_table(conn, table, state=None, itersize=STREAM_ITERSIZE, fingerprints=None):
+    """Stream a master table into D1 in multi-row, size-bounded batches"""
+    print(f"\n📊 Syncing {table} table...")
+    _metrics.start_table(table)
+
+    rows = stream_changed_rows(conn, table, state, itersize=itersize)
+    if fingerprints is not None:
+        rows = fingerprints.filter_changed(table, rows)
+    synced = 0
+
+    for statements, batch in iter_insert_batches(table, rows, get_d1_backend().bind_params):
+        pushed = push_batch(table, statements, batch)
+        # Dead-lettered rows are replayable, so the watermark may move past them
+        advance_watermark(state, table, batch)
+        if fingerprints is not None:
+            fingerprints.record(table, pushed)
+        synced += len(pushed)
+
+    print(f"   ✅ Synced {synced} {table}")
+
+
+def sync_users(conn, state=None, itersize=STREAM_ITERSIZE, fingerprints=None):
+    """Sync users table"""
+    sync_table(conn, 'users', state, itersize, fingerprints)
+
+
+def sync_companies(conn, state=None, itersize=STREAM_ITERSIZE, fingerprints=None):
+    """Sync companies table"""
+    sync_table(conn, 'companies', state, itersize, fingerprints)
+
+
+def sync_processes(conn, state=None, itersize=STREAM_ITERSIZE, fingerprints=None):
+    """Sync processes table"""
+    sync_table(conn, 'processes', state, itersize, fingerprints)
+
+
+def sync_roles(conn, state=None, itersize=STREAM_ITERSIZE, fingerprints=None):
+    """Sync roles table"""
+    sync_table(conn, 'roles', state, itersize, fingerprints)
+
+
+def sync_surveys(conn, limit=1000, state=None, itersize=STREAM_ITERSIZE,
+                 max_batch_bytes=D1_MAX_BATCH_BYTES, concurrency=SYNC_CONCURRENCY,
+                 fingerprints=None):
+    """Sync surveys table (with limit to avoid timeouts)
+
+    In incremental mode the oldest `limit` changes past the watermark are
+    synced, so consecutive runs walk forward through the backlog. Rows are
+    streamed from a server-side cursor straight into size-bounded batches of
+    multi-row INSERT statements, which are sent `concurrency` at a time.
+    """
     print(f"\n📊 Syncing surveys table (limit {limit})...")
+    _metrics.start_table('surveys')
+
+    rows = stream_changed_rows(conn, 'surveys', state, order_by='created_at DESC',
+                               limit=limit, itersize=itersize)
+    if fingerprints is not None:
+        rows = fingerprints.filter_changed('surveys', rows)
+    synced = 0
+
+    watermark_blocked = False
+    batches = iter_insert_batches('surveys', rows, get_d1_backend().bind_params,
+                                  max_batch_bytes=max_batch_bytes)
+    for batch_number, batch, pushed, error in execute_d1_batches('surveys', batches, concurrency):
+        if error is not None:
+            watermark_blocked = True
+            print(f"   ⚠️ Failed batch {batch_number}: {error}")
+            continue
+
+        # Only advance past contiguous successes so failed rows are retried;
+        # dead-lettered rows are replayable, so they do not block it
+        if not watermark_blocked:
+            advance_watermark(state, 'surveys', batch)
+        if fingerprints is not None:
+            fingerprints.record('surveys', pushed)
+        synced += len(pushed)
+        print(f"   ✅ Synced batch {batch_number} ({len(pushed)} of {len(batch)} surveys)")
+
+    print(f"   ✅ Completed syncing surveys ({synced} synced)")
+
+
+def sync_surveys_full(conn, page_size=SURVEY_PAGE_SIZE, checkpoint_path=SYNC_CHECKPOINT_FILE,
+                      restart=False, itersize=STREAM_ITERSIZE, max_batch_bytes=D1_MAX_BATCH_BYTES,
+                      concurrency=SYNC_CONCURRENCY, fingerprints=None):
+    """Sync the entire surveys table with keyset pagination on id
+
+    Each page (`WHERE id > last_id ORDER BY id LIMIT page_size`) is pushed in
+    size-bounded batches, `concurrency` at a time, and checkpointed once all
+    of its batches succeed, so an interrupted run resumes from the last
+    committed page. Returns True when the whole table was synced.
+    """
+    checkpoint = {} if restart else load_sync_state(checkpoint_path)
+    last_id = checkpoint.get('surveys', {}).get('last_id', 0)
+
+    print(f"\n📊 Syncing all surveys (page size {page_size}, resuming after id {last_id})...")
+    _metrics.start_table('surveys')
+
+    synced = 0
+    page_number = 0
+    while True:
+        page = list(stream_rows(
+            conn,
+            "SELECT * FROM surveys WHERE id > %s ORDER BY id LIMIT %s",
+            [last_id, page_size],
+            name='sync_surveys_page',
+            itersize=itersize,
+            table='surveys'
+        ))
+        # End the read-only transaction so no snapshot is held across pages
+        conn.rollback()
+
+        if not page:
+            break
+
+        page_number += 1
+        rows = page if fingerprints is None else fingerprints.filter_changed('surveys', page)
+        batches = iter_insert_batches('surveys', rows, get_d1_backend().bind_params,
+                                      max_batch_bytes=max_batch_bytes)
+        errors = []
+        pushed = 0
+        for _, _, batch_pushed, error in execute_d1_batches('surveys', batches, concurrency):
+            if error is not None:
+                errors.append(error)
+                continue
+            if fingerprints is not None:
+                fingerprints.record('surveys', batch_pushed)
+            pushed += len(batch_pushed)
+        if errors:
+            print(f"   ⚠️ Failed page {page_number} (ids {page[0]['id']}-{page[-1]['id']}): {errors[0]}")
+            print(f"   ↩️ Re-run to resume after id {last_id}")
+            return False
+
+        last_id = page[-1]['id']
+        synced += pushed
+        save_sync_state({'surveys': {'last_id': last_id}}, checkpoint_path)
+        print(f"   ✅ Synced page {page_number} ({pushed} of {len(page)} surveys, up to id {last_id})")
+
+    # Completed: the next full run starts from the beginning again
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    print(f"   ✅ Completed full survey sync ({synced} synced)")
+    return True
+
+
+def replay_dead_letters(path=SYNC_DEAD_LETTER_FILE):
+    """Push dead-lettered rows again; rows that still fail are written back
+
+    Returns True when every row was replayed or re-dead-lettered, False when
+    D1 failed transiently (unreplayed rows are written back untouched).
+    A <path>.replaying file left by an interrupted replay is replayed first,
+    followed by anything dead-lettered since.
+    """
+    replay_path = f"{path}.replaying"
+    if os.path.exists(replay_path):
+        print(f"⚠️ Resuming interrupted replay from {replay_path}")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                pending = f.read()
+            with open(replay_path, 'rb+') as f:
+                # The interrupted run may have died mid-line
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+                f.write(pending)
+                f.flush()
+                os.fsync(f.fileno())
+            os.remove(path)
+    elif os.path.exists(path):
+        os.replace(path, replay_path)
+    else:
+        print(f"ℹ️ No dead letters at {path}")
+        return True
+    log = DeadLetterLog(path)
+    set_dead_letter_log(log)
+
+    rows_by_table = {table: [] for table in TABLE_SCHEMAS}
+    with open(replay_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    print(f"⚠️ Skipping truncated dead letter line: {line[:80].strip()}")
+                    continue
+                rows_by_table[entry['table']].append(entry['values'])
+
+    print(f"\n📊 Replaying dead letters from {path}...")
+    replayed = 0
+    failure = None
+    # TABLE_SCHEMAS lists master tables before surveys, which keeps FK order
+    for table, rows in rows_by_table.items():
+        for statements, batch in iter_insert_batches(table, rows, get_d1_backend().bind_params):
+            if failure is None:
+                try:
+                    replayed += len(push_batch(table, statements, batch))
+                    continue
+                except D1CommandError as e:
+                    failure = e
+            for row in batch:
+                log.write(table, row, failure)
+
+    os.remove(replay_path)
+    print(f"   ✅ Replayed {replayed} rows, {log.count} still dead-lettered")
+    return failure is None
+
+
+CHANGE_NOTIFY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION safework_d1_sync_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{SYNC_NOTIFY_CHANNEL}', json_build_object(
+        'table', TG_TABLE_NAME,
+        'id', CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def install_change_triggers(conn, tables=TABLE_SCHEMAS):
+    """Create the NOTIFY trigger on every synced table (safe to re-run)
+
+    Only the table and id travel in the payload, well under the 8000 byte
+    NOTIFY limit; the daemon re-reads the current row when it applies it.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(CHANGE_NOTIFY_FUNCTION_SQL)
+        for table in tables:
+            cursor.execute(f"DROP TRIGGER IF EXISTS d1_sync_notify ON {table}")
+            cursor.execute(
+                f"CREATE TRIGGER d1_sync_notify AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE PROCEDURE safework_d1_sync_notify()"
+            )
+    conn.commit()
+    print(f"✅ Installed change triggers on {', '.join(tables)} (channel {SYNC_NOTIFY_CHANNEL})")
+
+
+def open_change_listener():
+    """Open a dedicated autocommit connection that LISTENs for row changes"""
+    conn = connect_postgres()
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {SYNC_NOTIFY_CHANNEL}")
+    return conn
+
+
+def build_delete_statements(table, ids, chunk_size=D1_DELETE_CHUNK_SIZE):
+    """Yield DELETE ... WHERE id IN (...) statements for sorted chunks of ids"""
+    ids = sorted(ids)
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        yield f"DELETE FROM {table} WHERE id IN ({', '.join(str(int(row_id)) for row_id in chunk)});", []
+
+
+def iter_d1_ids(table, page_size=D1_KEY_PAGE_SIZE):
+    """Yield every id in a D1 table in ascending order, one keyset page at a time"""
+    last_id = None
+    while True:
+        where = '' if last_id is None else f"WHERE id > {int(last_id)} "
+        rows = query_d1(f"SELECT id FROM {table} {where}ORDER BY id LIMIT {int(page_size)}")
+        for row in rows:
+            yield row['id']
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def prune_deleted_rows(conn, table, fingerprints=None, itersize=STREAM_ITERSIZE,
+                       page_size=D1_KEY_PAGE_SIZE):
+    """Delete D1 rows whose id no longer exists in Postgres
+
+    Both id sets are walked as ascending streams (a server-side cursor on
+    Postgres, keyset pages on D1) and merged, so memory stays at one page
+    plus one DELETE chunk however large the table is. D1 ids above the
+    highest Postgres id are left alone, since they may belong to rows
+    inserted after the Postgres cursor was opened.
+    """
+    print(f"\n🧹 Pruning deleted {table} rows...")
+    pg_ids = (row['id'] for row in stream_rows(conn, f"SELECT id FROM {table} ORDER BY id",
+                                                name=f"prune_{table}", itersize=itersize,
+                                                table=table))
+    pg_id = next(pg_ids, None)
+    stale, deleted, missing = [], 0, 0
+
+    def flush():
+        execute_with_retry(list(build_delete_statements(table, stale)))
+        if fingerprints is not None:
+            fingerprints.forget(table, stale)
+        return len(stale)
+
+    for d1_id in iter_d1_ids(table, page_size):
+        while pg_id is not None and pg_id < d1_id:
+            missing += 1
+            pg_id = next(pg_ids, None)
+        if pg_id is None:
+            break
+        if pg_id == d1_id:
+            pg_id = next(pg_ids, None)
+            continue
+
+        stale.append(d1_id)
+        if len(stale) >= D1_DELETE_CHUNK_SIZE:
+            deleted += flush()
+            stale = []
+
+    if stale:
+        deleted += flush()
+    if pg_id is not None:
+        missing += 1 + sum(1 for _ in pg_ids)
+
+    print(f"   ✅ Deleted {deleted} {table} rows from D1"
+          + (f" ({missing} Postgres rows not in D1 yet)" if missing else ""))
+    return deleted
+
+
+def _checksum_int(value):
+    return int(value)
+
+
+def _checksum_number(value):
+    return int(value * 100)
+
 
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute(f"""
-        SELECT * FROM surveys
-        ORDER BY created_at DESC
-        LIMIT {limit}
-    """)
-    surveys = cursor.fetchall()
-
-    print(f"   Found {len(surveys)} surveys")
-
-    # Batch process in chunks of 50
-    batch_size = 50
-    for i in range(0, len(surveys), batch_size):
-        batch = surveys[i:i+batch_size]
-        sql_commands = []
-
-        for survey in batch:
-            # Escape and serialize JSON fields
-            responses = json.dumps(survey.get('responses')) if survey.get('responses') else 'NULL'
-            data = json.dumps(survey.get('data')) if survey.get('data') else 'NULL'
-            symptoms_data = json.dumps(survey.get('symptoms_data')) if survey.get('symptoms_data') else 'NULL'
-
-            # Escape single quotes in strings
-            name = survey.get('name', '').replace("'", "''") if survey.get('name') else ''
-            department = survey.get('department', '').replace("'", "''") if survey.get('department') else ''
-
-            sql = f"""
-            INSERT OR REPLACE INTO surveys (
-                id, user_id, form_type, name, department, position, employee_id,
-                gender, age, years_of_service, employee_number, work_years, work_months,
-                has_symptoms, status, responses, data, symptoms_data,
-                company_id, process_id, role_id,
-                submission_date, created_at, updated_at
-            ) VALUES (
-                {survey['id']},
-                {survey['user_id']},
-                '{survey['form_type']}',
-                '{name}',
-                '{department}',
-                {f"'{survey['position']}'" if survey.get('position') else 'NULL'},
-                {f"'{survey['employee_id']}'" if survey.get('employee_id') else 'NULL'},
-                {f"'{survey['gender']}'" if survey.get('gender') else 'NULL'},
-                {survey.get('age') if survey.get('age') else 'NULL'},
-                {survey.get('years_of_service') if survey.get('years_of_service') else 'NULL'},
-                {f"'{survey['employee_number']}'" if survey.get('employee_number') else 'NULL'},
-                {survey.get('work_years') if survey.get('work_years') else 'NULL'},
-                {survey.get('work_months') if survey.get('work_months') else 'NULL'},
-                {1 if survey.get('has_symptoms') else 0},
-                '{survey['status']}',
-                {f"'{responses}'" if responses != 'NULL' else 'NULL'},
-                {f"'{data}'" if data != 'NULL' else 'NULL'},
-                {f"'{symptoms_data}'" if symptoms_data != 'NULL' else 'NULL'},
-                {survey.get('company_id') if survey.get('company_id') else 'NULL'},
-                {survey.get('process_id') if survey.get('process_id') else 'NULL'},
-                {survey.get('role_id') if survey.get('role_id') else 'NULL'},
-                '{survey['submission_date']}',
-                '{survey['created_at']}',
-                '{survey['updated_at']}'
-            );
-            """
-            sql_commands.append(sql)
-
-        if sql_commands:
+# Text checksums sample the first and last characters plus the quarter
+# points in between, each weighted by its sample number
+TEXT_CHECKSUM_SAMPLES = 4
+
+
+def _checksum_text(value):
+    value = str(value)
+    if not value:
+        return 0
+    last = len(value) - 1
+    return len(value) + sum(
+        (sample + 1) * ord(value[last * sample // TEXT_CHECKSUM_SAMPLES])
+        for sample in range(TEXT_CHECKSUM_SAMPLES + 1)
+    )
+
+
+def _checksum_timestamp(value):
+    # Mirrors SQLite's strftime('%s') * 1000 + milliseconds from strftime('%f'):
+    # UTC milliseconds after rounding to the nearest millisecond
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return 0
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return calendar.timegm(parsed.timetuple()) * 1000 + (parsed.microsecond + 500) // 1000
+
+
+# D1 has no hash functions, so rows are checksummed with plain SQLite
+# arithmetic: text contributes its length and five sampled characters (an
+# edit that changes none of them and keeps the length goes unnoticed), and
+# updated_at (milliseconds) catches most such edits anyway
+TEXT_CHECKSUM_SQL = "length({column}) + coalesce(" + " + ".join(
+    f"{sample + 1} * unicode(substr({{column}}, 1 + (length({{column}}) - 1) * {sample} / {TEXT_CHECKSUM_SAMPLES}, 1))"
+    for sample in range(TEXT_CHECKSUM_SAMPLES + 1)
+) + ", 0)"
+TIMESTAMP_CHECKSUM_SQL = ("CAST(strftime('%s', {column}) AS INTEGER) * 1000"
+                          " + CAST(substr(strftime('%f', {column}), 4) AS INTEGER)")
+
+# Row checksums are reduced modulo a prime: with epoch milliseconds weighted
+# by column position a raw row checksum reaches ~1e14, and D1 returns
+# integers as JS numbers, exact only up to 2**53. Reduced, even a
+# VERIFY_RANGE_SIZE range sums to ~1e13 and comes back exact.
+CHECKSUM_MODULUS = 1_000_000_007
+
+# Per-kind row checksum terms, as Python over encoded values and as D1 SQL
+CHECKSUM_TERMS = {
+    'int': (_checksum_int, "{column}"),
+    'bool': (_checksum_int, "{column}"),
+    'number': (_checksum_number, "CAST({column} * 100 AS INTEGER)"),
+    'text': (_checksum_text, TEXT_CHECKSUM_SQL),
+    'json': (_checksum_text, TEXT_CHECKSUM_SQL),
+    'timestamp': (_checksum_timestamp, TIMESTAMP_CHECKSUM_SQL),
+}
+
+
+def row_checksum(table, row):
+    """Checksum of one Postgres row, as D1 would compute it over the synced values"""
+    total = 0
+    for position, (spec, value) in enumerate(zip(TABLE_SCHEMAS[table], get_row_encoder(table).values(row)), 1):
+        if value is not None:
+            total += position * CHECKSUM_TERMS[spec[1]][0](value)
+    return total % CHECKSUM_MODULUS
+
+
+def row_checksum_sql(table):
+    """SQL expression computing row_checksum() inside D1"""
+    total = ' + '.join(
+        f"{position} * coalesce({CHECKSUM_TERMS[spec[1]][1].format(column=spec[0])}, 0)"
+        for position, spec in enumerate(TABLE_SCHEMAS[table], 1)
+    )
+    # SQLite's % keeps the dividend's sign; adding the modulus once more
+    # matches Python's non-negative result for negative totals
+    return f"(({total}) % {CHECKSUM_MODULUS} + {CHECKSUM_MODULUS}) % {CHECKSUM_MODULUS}"
+
+
+def d1_range_checksums(table, width, low=None, high=None):
+    """{bucket: (count, id sum, checksum sum)} for id // width buckets in D1"""
+    where = '' if low is None else f"WHERE id >= {int(low)} AND id < {int(high)} "
+    rows = query_d1(
+        f"SELECT id / {int(width)} AS bucket, count(*) AS row_count, sum(id) AS id_sum, "
+        f"sum({row_checksum_sql(table)}) AS checksum FROM {table} {where}"
+        f"GROUP BY bucket ORDER BY bucket"
+    )
+    return {row['bucket']: (row['row_count'], row['id_sum'], row['checksum']) for row in rows}
+
+
+def pg_range_checksums(rows, table, width):
+    """Same aggregates as d1_range_checksums, folded over a stream of Postgres rows"""
+    buckets = {}
+    for row in rows:
+        count, id_sum, checksum = buckets.get(row['id'] // width, (0, 0, 0))
+        buckets[row['id'] // width] = (count + 1, id_sum + row['id'], checksum + row_checksum(table, row))
+    return buckets
+
+
+def verify_table(conn, table, range_size=VERIFY_RANGE_SIZE, subrange_size=VERIFY_SUBRANGE_SIZE,
+                 itersize=STREAM_ITERSIZE):
+    """Compare a table between Postgres and D1 by range checksums, drilling into mismatches
+
+    One grouped query checksums every range_size-id range in D1 while the
+    Postgres side is folded from a single streamed scan. Only mismatched
+    ranges are split into subrange_size buckets, and only mismatched
+    buckets are compared row by row. Returns {'missing', 'extra',
+    'different'} id lists.
+    """
+    print(f"\n🔎 Verifying {table}...")
+    pg_rows = stream_rows(conn, f"SELECT * FROM {table} ORDER BY id", name=f"verify_{table}",
+                          itersize=itersize, table=table)
+    pg_ranges = pg_range_checksums(pg_rows, table, range_size)
+    d1_ranges = d1_range_checksums(table, range_size)
+    queries = 1
+
+    result = {'missing': [], 'extra': [], 'different': []}
+    mismatched = sorted(bucket for bucket in pg_ranges.keys() | d1_ranges.keys()
+                        if pg_ranges.get(bucket) != d1_ranges.get(bucket))
+
+    for bucket in mismatched:
+        low, high = bucket * range_size, (bucket + 1) * range_size
+        pg_range_rows = {row['id']: row_checksum(table, row) for row in stream_rows(
+            conn, f"SELECT * FROM {table} WHERE id >= %s AND id < %s ORDER BY id", [low, high],
+            name=f"verify_{table}_range", itersize=itersize, table=table)}
+        pg_subranges = {}
+        for row_id, checksum in pg_range_rows.items():
+            count, id_sum, total = pg_subranges.get(row_id // subrange_size, (0, 0, 0))
+            pg_subranges[row_id // subrange_size] = (count + 1, id_sum + row_id, total + checksum)
+        d1_subranges = d1_range_checksums(table, subrange_size, low, high)
+        queries += 1
+
+        for subrange in sorted(pg_subranges.keys() | d1_subranges.keys()):
+            if pg_subranges.get(subrange) == d1_subranges.get(subrange):
+                continue
+            sub_low, sub_high = subrange * subrange_size, (subrange + 1) * subrange_size
+            d1_rows = {row['id']: row['checksum'] for row in query_d1(
+                f"SELECT id, {row_checksum_sql(table)} AS checksum FROM {table} "
+                f"WHERE id >= {sub_low} AND id < {sub_high}"
+            )}
+            queries += 1
+            pg_sub_rows = {row_id: checksum for row_id, checksum in pg_range_rows.items()
+                           if sub_low <= row_id < sub_high}
+            for row_id in sorted(pg_sub_rows.keys() | d1_rows.keys()):
+                if row_id not in d1_rows:
+                    result['missing'].append(row_id)
+                elif row_id not in pg_sub_rows:
+                    result['extra'].append(row_id)
+                elif pg_sub_rows[row_id] != d1_rows[row_id]:
+                    result['different'].append(row_id)
+    conn.rollback()
+
+    if not mismatched:
+        print(f"   ✅ {table} matches ({len(pg_ranges)} ranges, {queries} D1 queries)")
+    else:
+        print(f"   ❌ {table}: {len(mismatched)} of {len(pg_ranges.keys() | d1_ranges.keys())} ranges differ"
+              f" ({queries} D1 queries)")
+        for kind, ids in result.items():
+            if ids:
+                sample = ', '.join(str(row_id) for row_id in ids[:10])
+                print(f"      {kind}: {len(ids)} (e.g. {sample}{', ...' if len(ids) > 10 else ''})")
+    return result
+
+
+def apply_row_changes(conn, changes, state=None, fingerprints=None):
+    """Bring D1 in line with Postgres for a set of changed ids per table
+
+    Each id is re-read from Postgres: rows that still exist are upserted
+    (parents before children), ids that are gone are deleted from D1
+    (children before parents). Replaying the same ids twice is harmless.
+    """
+    tables = [table for table in TABLE_SCHEMAS if changes.get(table)]
+    missing = {}
+
+    for table in tables:
+        ids = sorted(changes[table])
+        query = f"SELECT * FROM {table} WHERE id = ANY(%s) ORDER BY id"
+        rows = list(stream_rows(conn, query, [ids], name=f"cdc_{table}", table=table))
+        found = {row['id'] for row in rows}
+        missing[table] = [row_id for row_id in ids if row_id not in found]
+
+        changed = rows if fingerprints is None else fingerprints.filter_changed(table, rows)
+        for statements, batch in iter_insert_batches(table, changed, get_d1_backend().bind_params):
+            pushed = push_batch(table, statements, batch)
+            if fingerprints is not None:
+                fingerprints.record(table, pushed)
+        advance_watermark(state, table, rows)
+
+    for table in reversed(tables):
+        if not missing[table]:
+            continue
+        execute_with_retry(list(build_delete_statements(table, missing[table])))
+        if fingerprints is not None:
+            fingerprints.forget(table, missing[table])
+
+    return {table: (len(changes[table]) - len(missing[table]), len(missing[table])) for table in tables}
+
+
+def run_change_daemon(pool, listener, state=None, state_path=SYNC_STATE_FILE, fingerprints=None,
+                      max_latency=SYNC_DAEMON_MAX_LATENCY, max_batch_rows=SYNC_DAEMON_BATCH_ROWS):
+    """Apply NOTIFY'd row changes to D1 until SIGINT/SIGTERM
+
+    Changes are coalesced per (table, id) and flushed once the oldest pending
+    change is max_latency seconds old or max_batch_rows ids are waiting. A
+    failed flush keeps its ids pending and is retried on the next tick. On
+    shutdown, whatever is still pending is flushed (with retries) before
+    returning.
+    """
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    print(f"\n👂 Listening on {SYNC_NOTIFY_CHANNEL} (flush every {max_latency}s or {max_batch_rows} rows)")
+    pending, oldest = {}, None
+    applied = 0
+
+    def collect_notifies():
+        nonlocal oldest
+        listener.poll()
+        while listener.notifies:
+            notify = listener.notifies.pop(0)
             try:
-                execute_d1_command('\n'.join(sql_commands))
-                print(f"   ✅ Synced batch {i//batch_size + 1} ({len(batch)} surveys)")
-            except Exception as e:
-                print(f"   ⚠️ Failed batch {i//batch_size + 1}: {e}")
+                change = json.loads(notify.payload)
+                table, row_id = change['table'], int(change['id'])
+            except (ValueError, KeyError, TypeError):
+                print(f"   ⚠️ Ignoring malformed notification: {notify.payload!r}")
+                continue
+            if table not in TABLE_SCHEMAS:
+                continue
+            pending.setdefault(table, set()).add(row_id)
+            if oldest is None:
+                oldest = time.monotonic()
+
+    def flush():
+        nonlocal pending, oldest, applied
+        pending_rows = sum(len(ids) for ids in pending.values())
+        lag = time.monotonic() - oldest
+        counts = run_with_pooled_connection(
+            pool, lambda conn: apply_row_changes(conn, pending, state, fingerprints)
+        )
+        if state is not None:
+            save_sync_state(state, state_path)
+        applied += pending_rows
+        summary = ', '.join(f"{table} +{upserted}/-{deleted}"
+                            for table, (upserted, deleted) in counts.items())
+        print(f"   ✅ Applied {pending_rows} changes ({summary}) after {lag:.2f}s")
+        pending, oldest = {}, None
+
+    while not stopping.is_set():
+        wait_seconds = max_latency if oldest is None else max(0.0, oldest + max_latency - time.monotonic())
+        if select.select([listener], [], [], min(wait_seconds, 1.0))[0]:
+            collect_notifies()
+
+        pending_rows = sum(len(ids) for ids in pending.values())
+        if not pending_rows:
+            continue
+        if pending_rows < max_batch_rows and time.monotonic() - oldest < max_latency:
+            continue
 
-    cursor.close()
-    print(f"   ✅ Completed syncing surveys")
+        try:
+            flush()
+        except Exception as e:
+            print(f"   ⚠️ Flush of {pending_rows} changes failed, retrying: {e}")
+            stopping.wait(SYNC_RETRY_BASE_DELAY)
+
+    # Deletes are only ever seen as notifications, so nothing still pending
+    # may be dropped on the way out: drain the socket and flush once more
+    collect_notifies()
+    for attempt in range(SYNC_RETRIES + 1):
+        if not pending:
+            break
+        try:
+            flush()
+        except Exception as e:
+            if attempt == SYNC_RETRIES:
+                lost = {table: sorted(ids) for table, ids in pending.items()}
+                print(f"   ❌ Final flush failed, these changes were not applied: {lost} ({e})")
+                break
+            delay = min(SYNC_RETRY_MAX_DELAY, SYNC_RETRY_BASE_DELAY * 2 ** attempt)
+            print(f"   ⚠️ Final flush failed, retry {attempt + 1}/{SYNC_RETRIES} in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+    print(f"\n🛑 Daemon stopped after applying {applied} changes")
+    return applied
+
+
+def snapshot_compression():
+    """Use zstd when the zstandard package is installed, gzip otherwise"""
+    try:
+        import zstandard  # noqa: F401
+        return 'zst'
+    except ImportError:
+        return 'gz'
+
+
+def open_snapshot_chunk(path, mode):
+    """Open a chunk file for binary writing ('w') or line-by-line text reading ('r')"""
+    if path.endswith('.zst'):
+        import zstandard
+
+        if mode == 'w':
+            return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'))
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb')),
+                                encoding='utf-8')
+    if mode == 'w':
+        return gzip.open(path, 'wb', compresslevel=6)
+    return gzip.open(path, 'rt', encoding='utf-8')
+
+
+class SnapshotChunkWriter:
+    """File-like sink for COPY ... TO STDOUT that rotates compressed JSONL chunks
+
+    Every line COPY writes is one row as JSON; a new chunk file is started
+    every chunk_rows lines.
+    """
+
+    def __init__(self, directory, table, chunk_rows=SNAPSHOT_CHUNK_ROWS, compression='gz'):
+        self.directory = directory
+        self.table = table
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.chunks = []
+        self.rows = 0
+        self._file = None
+        self._partial = b''
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+
+        while lines:
+            if self._file is None or self.chunks[-1]['rows'] >= self.chunk_rows:
+                self._next_chunk()
+            take = lines[:self.chunk_rows - self.chunks[-1]['rows']]
+            del lines[:len(take)]
+            self._file.write(b'\n'.join(take) + b'\n')
+            self.chunks[-1]['rows'] += len(take)
+            self.rows += len(take)
+        return len(data)
+
+    def _next_chunk(self):
+        if self._file is not None:
+            self._file.close()
+        name = f"{self.table}-{len(self.chunks) + 1:05d}.jsonl.{self.compression}"
+        self._file = open_snapshot_chunk(os.path.join(self.directory, name), 'w')
+        self.chunks.append({'file': name, 'rows': 0})
+
+    def close(self):
+        if self._partial:
+            self.write(b'\n')
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def export_snapshot(conn, directory, chunk_rows=SNAPSHOT_CHUNK_ROWS, tables=TABLE_SCHEMAS):
+    """Dump every table to compressed JSONL chunks with COPY ... TO STDOUT
+
+    All tables are read in one REPEATABLE READ transaction, so the snapshot
+    is consistent across FK parents and children. Rows are serialized by
+    Postgres itself (row_to_json) and streamed straight into the chunk
+    files; a manifest.json lists the chunks for load_snapshot().
+    """
+    os.makedirs(directory, exist_ok=True)
+    compression = snapshot_compression()
+    manifest = {
+        'created_at': datetime.now().isoformat(),
+        'compression': compression,
+        'tables': {}
+    }
+
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    try:
+        with conn.cursor() as cursor:
+            for table in tables:
+                print(f"\n📦 Exporting {table}...")
+                started = time.perf_counter()
+                writer = SnapshotChunkWriter(directory, table, chunk_rows, compression)
+                try:
+                    # CSV with control-character quote/delimiter passes the JSON through unescaped
+                    cursor.copy_expert(
+                        f"COPY (SELECT row_to_json(t)::text FROM (SELECT * FROM {table} ORDER BY id) t) "
+                        f"TO STDOUT WITH (FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01')",
+                        writer
+                    )
+                finally:
+                    writer.close()
+                _metrics.add_time(table, 'fetch', time.perf_counter() - started)
+                manifest['tables'][table] = {'rows': writer.rows, 'chunks': writer.chunks}
+                print(f"   ✅ {writer.rows} rows in {len(writer.chunks)} chunks")
+    finally:
+        conn.rollback()
+        conn.set_session(isolation_level='DEFAULT', readonly='DEFAULT')
+
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"\n✅ Snapshot written to {directory}")
+    return manifest
+
+
+def iter_snapshot_rows(path, table):
+    """Yield the rows of one chunk file, with timestamps parsed back into datetimes"""
+    timestamp_columns = [spec[0] for spec in TABLE_SCHEMAS[table] if spec[1] == 'timestamp']
+    with open_snapshot_chunk(path, 'r') as f:
+        for line in f:
+            row = json.loads(line)
+            for column in timestamp_columns:
+                if isinstance(row.get(column), str):
+                    try:
+                        row[column] = datetime.fromisoformat(row[column])
+                    except ValueError:
+                        pass
+            yield row
+
+
+def load_snapshot(directory, restart=False, max_batch_bytes=D1_MAX_BATCH_BYTES,
+                  concurrency=SYNC_CONCURRENCY):
+    """Replay an export_snapshot() directory into the configured D1 backend
+
+    Tables load parents first; each chunk goes through the usual batching,
+    retry and dead-letter path. Finished chunks are recorded in
+    .load_progress.json so an interrupted restore resumes where it stopped.
+    """
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    progress_path = os.path.join(directory, '.load_progress.json')
+    loaded = set()
+    if not restart and os.path.exists(progress_path):
+        with open(progress_path) as f:
+            loaded = set(json.load(f))
+        print(f"↩️ Resuming snapshot load ({len(loaded)} chunks already loaded)")
+
+    bind_params = get_d1_backend().bind_params
+    for table in TABLE_SCHEMAS:
+        if table not in manifest['tables']:
+            continue
+        print(f"\n📥 Loading {table} ({manifest['tables'][table]['rows']} rows)...")
+        _metrics.start_table(table)
+
+        for chunk in manifest['tables'][table]['chunks']:
+            if chunk['file'] in loaded:
+                continue
+            rows = iter_snapshot_rows(os.path.join(directory, chunk['file']), table)
+            batches = iter_insert_batches(table, rows, bind_params, max_batch_bytes=max_batch_bytes)
+            pushed = 0
+            for batch_number, batch, batch_pushed, error in execute_d1_batches(table, batches, concurrency):
+                if error is not None:
+                    print(f"   ❌ {chunk['file']} batch {batch_number} failed: {error}")
+                    return False
+                pushed += len(batch_pushed)
+
+            loaded.add(chunk['file'])
+            with open(progress_path, 'w') as f:
+                json.dump(sorted(loaded), f)
+            print(f"   ✅ {chunk['file']}: {pushed} of {chunk['rows']} rows")
+
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    print(f"\n✅ Snapshot {directory} loaded")
+    return True
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Synchronize PostgreSQL data to Cloudflare D1")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only sync rows changed since the last successful run")
+    parser.add_argument('--state-file', default=SYNC_STATE_FILE,
+                        help=f"Watermark state file for --incremental (default: {SYNC_STATE_FILE})")
+    parser.add_argument('--reset-state', action='store_true',
+                        help="Discard saved watermarks before an incremental run")
+    parser.add_argument('--limit', type=int, default=1000,
+                        help="Maximum surveys to sync when not using --full (default: 1000)")
+    parser.add_argument('--full', action='store_true',
+                        help="Sync every survey by keyset pagination on id, resuming from the checkpoint")
+    parser.add_argument('--page-size', type=int, default=SURVEY_PAGE_SIZE,
+                        help=f"Surveys per page for --full (default: {SURVEY_PAGE_SIZE})")
+    parser.add_argument('--checkpoint-file', default=SYNC_CHECKPOINT_FILE,
+                        help=f"Page checkpoint file for --full (default: {SYNC_CHECKPOINT_FILE})")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore the --full checkpoint (or --load-snapshot progress) and start over")
+    parser.add_argument('--batch-bytes', type=int, default=D1_MAX_BATCH_BYTES,
+                        help=f"Maximum SQL bytes per survey D1 execute call (default: {D1_MAX_BATCH_BYTES})")
+    parser.add_argument('--concurrency', type=int, default=SYNC_CONCURRENCY,
+                        help=f"Survey batches sent to D1 in parallel (default: {SYNC_CONCURRENCY})")
+    parser.add_argument('--backend', choices=sorted(D1_BACKENDS), default=D1_BACKEND,
+                        help=f"How SQL reaches D1 (default: {D1_BACKEND})")
+    parser.add_argument('--sqlite-path', default=D1_SQLITE_PATH,
+                        help=f"SQLite file used by --backend sqlite (default: {D1_SQLITE_PATH})")
+    parser.add_argument('--bind-params', action=argparse.BooleanOptionalAction, default=None,
+                        help="Send bound parameters instead of escaped literals "
+                             "(default: on for http, off for sqlite; wrangler only sends literals)")
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help="Only push rows whose content hash changed since their last successful push")
+    parser.add_argument('--fingerprint-db', default=SYNC_FINGERPRINT_DB,
+                        help=f"Row hash cache for --skip-unchanged (default: {SYNC_FINGERPRINT_DB})")
+    parser.add_argument('--reset-fingerprints', action='store_true',
+                        help="Forget cached row hashes, e.g. after D1 was recreated")
+    parser.add_argument('--dead-letter-file', default=SYNC_DEAD_LETTER_FILE,
+                        help=f"JSONL file for rows D1 rejects (default: {SYNC_DEAD_LETTER_FILE})")
+    parser.add_argument('--replay-dead-letters', action='store_true',
+                        help="Push the rows in --dead-letter-file again and exit")
+    parser.add_argument('--report', metavar='PATH',
+                        help="Write a JSON run report (rows/s, bytes, phase times, batch latency)")
+    parser.add_argument('--prometheus-textfile', metavar='PATH',
+                        help="Also write the run report as a node_exporter textfile (.prom)")
+    parser.add_argument('--table-workers', type=int, default=SYNC_TABLE_WORKERS,
+                        help=f"Tables synced in parallel on pooled connections (default: {SYNC_TABLE_WORKERS})")
+    parser.add_argument('--itersize', type=int, default=STREAM_ITERSIZE,
+                        help=f"Rows fetched per server-side cursor round trip (default: {STREAM_ITERSIZE})")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Catch up incrementally, then keep applying NOTIFY'd row changes until stopped")
+    parser.add_argument('--install-triggers', action='store_true',
+                        help=f"Create the {SYNC_NOTIFY_CHANNEL} NOTIFY triggers in Postgres and exit")
+    parser.add_argument('--max-latency', type=float, default=SYNC_DAEMON_MAX_LATENCY,
+                        help=f"Seconds a change may wait before --daemon flushes it (default: {SYNC_DAEMON_MAX_LATENCY})")
+    parser.add_argument('--daemon-batch-rows', type=int, default=SYNC_DAEMON_BATCH_ROWS,
+                        help=f"Pending changes that force an early --daemon flush (default: {SYNC_DAEMON_BATCH_ROWS})")
+    parser.add_argument('--prune-deleted', action='store_true',
+                        help="After syncing, delete D1 rows whose id no longer exists in Postgres")
+    parser.add_argument('--verify', action='store_true',
+                        help="Compare Postgres and D1 by id-range checksums instead of syncing "
+                             "(text is sampled at five points plus its length, so a same-length edit "
+                             "that leaves those characters and updated_at alone is not detected)")
+    parser.add_argument('--export-snapshot', metavar='DIR',
+                        help="Dump every table to compressed JSONL chunks via COPY and exit")
+    parser.add_argument('--load-snapshot', metavar='DIR',
+                        help="Load an --export-snapshot directory into D1 and exit (resumable)")
+    parser.add_argument('--snapshot-chunk-rows', type=int, default=SNAPSHOT_CHUNK_ROWS,
+                        help=f"Rows per snapshot chunk file (default: {SNAPSHOT_CHUNK_ROWS})")
+    return parser.parse_args()
 
 
 def main():
     """Main synchronization function"""
+    args = parse_args()
+
     print("="*60)
     print("PostgreSQL to D1 Data Synchronization")
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    if args.incremental:
+        print(f"Mode: incremental (state: {args.state_file})")
+    if args.skip_unchanged:
+        print(f"Skipping unchanged rows (fingerprints: {args.fingerprint_db})")
+    print(f"D1 backend: {args.backend}")
     print("="*60)
 
+    if args.install_triggers:
+        conn = connect_postgres()
+        try:
+            install_change_triggers(conn)
+        finally:
+            conn.close()
+        return
+
+    # The daemon keeps watermarks so a restart only catches up on what it missed
+    if args.daemon:
+        args.incremental = True
+
+    backend_options = {}
+    if args.bind_params is not None:
+        if args.backend == 'wrangler':
+            if args.bind_params:
+                print("⚠️ --bind-params is not supported by wrangler; sending escaped literals")
+        else:
+            backend_options['bind_params'] = args.bind_params
+    if args.backend == 'sqlite':
+        backend_options['path'] = args.sqlite_path
+    elif args.backend == 'http':
+        backend_options['pool_size'] = args.concurrency
+    set_d1_backend(create_d1_backend(args.backend, **backend_options))
+    set_dead_letter_log(DeadLetterLog(args.dead_letter_file))
+
+    if args.replay_dead_letters:
+        success = replay_dead_letters(args.dead_letter_file)
+        _d1_backend.close()
+        sys.exit(0 if success else 1)
+
+    if args.export_snapshot:
+        conn = connect_postgres()
+        try:
+            export_snapshot(conn, args.export_snapshot, args.snapshot_chunk_rows)
+        finally:
+            conn.close()
+            _d1_backend.close()
+        return
+
+    if args.load_snapshot:
+        try:
+            success = load_snapshot(args.load_snapshot, args.restart, args.batch_bytes, args.concurrency)
+        finally:
+            _d1_backend.close()
+        print_run_summary(_metrics.report(success, options=vars(args)))
+        sys.exit(0 if success else 1)
+
+    if args.verify:
+        conn = connect_postgres()
+        try:
+            results = [verify_table(conn, table, itersize=args.itersize) for table in TABLE_SCHEMAS]
+        finally:
+            conn.close()
+            _d1_backend.close()
+        in_sync = not any(ids for result in results for ids in result.values())
+        print("\n✅ D1 matches PostgreSQL" if in_sync else "\n❌ D1 differs from PostgreSQL")
+        sys.exit(0 if in_sync else 1)
+
+    state = None
+    if args.incremental:
+        state = {} if args.reset_state else load_sync_state(args.state_file)
+
+    fingerprints = None
+    if args.skip_unchanged or args.reset_fingerprints:
+        fingerprints = RowFingerprintCache(args.fingerprint_db)
+        if args.reset_fingerprints:
+            fingerprints.reset()
+        if not args.skip_unchanged:
+            fingerprints.close()
+            fingerprints = None
+
+    def sync_survey_data(conn):
+        if args.full:
+            if not sync_surveys_full(conn, args.page_size, args.checkpoint_file,
+                                     args.restart, args.itersize, args.batch_bytes,
+                                     args.concurrency, fingerprints):
+                raise Exception("full survey sync interrupted; checkpoint saved")
+        else:
+            # The daemon's catch-up pass must cover the whole backlog before it
+            # starts advancing watermarks from notifications
+            sync_surveys(conn, limit=None if args.daemon else args.limit, state=state, itersize=args.itersize,
+                         max_batch_bytes=args.batch_bytes, concurrency=args.concurrency,
+                         fingerprints=fingerprints)
+
+    tasks = {
+        'users': lambda conn: sync_users(conn, state, args.itersize, fingerprints),
+        'companies': lambda conn: sync_companies(conn, state, args.itersize, fingerprints),
+        'processes': lambda conn: sync_processes(conn, state, args.itersize, fingerprints),
+        'roles': lambda conn: sync_roles(conn, state, args.itersize, fingerprints),
+        'surveys': sync_survey_data,
+    }
+
     # Connect to PostgreSQL
-    conn = connect_postgres()
+    pool = connect_postgres_pool(args.table_workers)
+    # LISTEN before catching up so nothing committed in between is missed
+    listener = open_change_listener() if args.daemon else None
+    success = False
 
     try:
-        # Sync master data first (required for foreign keys)
-        sync_users(conn)
-        sync_companies(conn)
-        sync_processes(conn)
-        sync_roles(conn)
+        # Master tables load in parallel; surveys only start once all of
+        # their FK parents have been pushed (see SYNC_DEPENDENCIES)
+        run_sync_graph(pool, tasks, max_workers=args.table_workers)
+
+        if args.prune_deleted:
+            # Children first, so no D1 row is left pointing at a pruned parent
+            for table in reversed(list(TABLE_SCHEMAS)):
+                run_with_pooled_connection(
+                    pool, lambda conn: prune_deleted_rows(conn, table, fingerprints, args.itersize)
+                )
 
-        # Sync survey data
-        sync_surveys(conn, limit=1000)  # Adjust limit as needed
+        if listener is not None:
+            save_sync_state(state, args.state_file)
+            run_change_daemon(pool, listener, state, args.state_file, fingerprints,
+                              args.max_latency, args.daemon_batch_rows)
 
+        if fingerprints is not None:
+            print(f"\n⏭️ Skipped {fingerprints.skipped} unchanged rows")
+        if _dead_letters.count:
+            print(f"\n☠️ {_dead_letters.count} rows dead-lettered to {args.dead_letter_file}"
+                  f" (replay with --replay-dead-letters)")
+
+        success = True
         print("\n" + "="*60)
         print("✅ Synchronization completed successfully!")
         print(f"Finished at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -323,7 +2147,23 @@ def main():
         sys.exit(1)
 
     finally:
-        conn.close()
+        # Watermarks only advance after a successful push, so partial runs are safe to save
+        if state is not None:
+            save_sync_state(state, args.state_file)
+        if listener is not None:
+            listener.close()
+        pool.closeall()
+        _d1_backend.close()
+        if fingerprints is not None:
+            fingerprints.close()
+
+        report = _metrics.report(success, options=vars(args))
+        print_run_summary(report)
+        if args.report:
+            write_run_report(report, args.report)
+            print(f"📝 Run report written to {args.report}")
+        if args.prometheus_textfile:
+            write_prometheus_textfile(report, args.prometheus_textfile)
 
 
 if __name__ == "__main__":
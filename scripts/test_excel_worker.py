@@ -1,15 +1,37 @@
 #!/usr/bin/env python3
 """
-Test script for Excel Worker functionality
-Tests the Excel processing worker endpoints
+Test and benchmark script for Excel Worker functionality
+Smoke-tests the Excel processing worker endpoints, or drives concurrent load
+at them and reports throughput and p50/p95/p99 latency
+
+Usage:
+    python test_excel_worker.py --smoke                  # one request per endpoint
+    python test_excel_worker.py                          # benchmark the bundled local mock
+    python test_excel_worker.py --url http://localhost:8787/api/excel --concurrency 32 --requests 2000
+    python test_excel_worker.py --mock --save-baseline bench.json
+    python test_excel_worker.py --mock --baseline bench.json --max-regression 0.25
 """
 
+import argparse
 import requests
 import json
 import base64
 import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def test_excel_worker():
+from percentiles import nearest_rank
+
+PRODUCTION_URL = "https://safework.jclee.me/api/excel"
+LOCAL_URL = "http://localhost:8787/api/excel"
+MOCK_SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "excel_worker_mock.py")
+
+BENCHMARK_ENDPOINTS = ["process-excel", "form-structure", "export-to-excel", "validate-excel"]
+
+def test_excel_worker(base_url=PRODUCTION_URL):
     """Test the Excel worker endpoints"""
 
     print("🔄 Testing Excel Worker Implementation...")
@@ -41,9 +63,6 @@ def test_excel_worker():
         ]
     }
 
-    # Test endpoints
-    base_url = "https://safework.jclee.me/api/excel"
-
     print(f"📡 Testing against: {base_url}")
 
     # Test 1: Process Excel (mock)
@@ -158,7 +177,7 @@ def test_local_worker():
 
     try:
         # Try local worker first
-        local_url = "http://localhost:8787/api/excel"
+        local_url = LOCAL_URL
 
         response = requests.get(f"{local_url}/form-structure/test", timeout=5)
         print("✅ Local worker is running!")
@@ -186,16 +205,209 @@ def test_excel_worker_at_url(base_url):
         print(f"❌ Worker test failed: {str(e)}")
         return False
 
-if __name__ == "__main__":
+def benchmark_requests():
+    """(method, path, payload) for one request to each benchmarked endpoint"""
+    structure = {
+        "formId": "002_musculoskeletal_symptom_program",
+        "fields": [{"id": f"field_{i}", "type": "text", "required": False, "label": f"항목 {i}"} for i in range(40)],
+        "sections": [{"id": "misc", "title": "기타", "fields": [f"field_{i}" for i in range(40)]}]
+    }
+    file_data = base64.b64encode(json.dumps(structure).encode()).decode()
+    return {
+        "process-excel": ("POST", "/process-excel",
+                          {"fileData": file_data, "fileName": "002_musculoskeletal_symptom_program.xls"}),
+        "form-structure": ("GET", "/form-structure/002_musculoskeletal_symptom_program", None),
+        "export-to-excel": ("POST", "/export-to-excel",
+                            {"formType": "002_musculoskeletal_symptom_program", "responses": [], "format": "xlsx"}),
+        "validate-excel": ("POST", "/validate-excel",
+                           {"fileData": file_data, "expectedFields": ["company_name", "department", "investigator_name"]}),
+    }
+
+def run_load(base_url, endpoint, concurrency, total_requests, duration=None, warmup=0, timeout=30):
+    """Hammer one endpoint from `concurrency` threads, each on its own keep-alive session
+
+    Stops after total_requests, or after `duration` seconds when given.
+    Returns latency percentiles (ms), throughput and error counts.
+    """
+    method, path, payload = benchmark_requests()[endpoint]
+    url = f"{base_url}{path}"
+    latencies, errors = [], {}
+    lock = threading.Lock()
+    issued = [0]
+
+    def next_request():
+        with lock:
+            if duration is None and issued[0] >= total_requests:
+                return False
+            issued[0] += 1
+            return True
+
+    def worker(deadline):
+        session = requests.Session()
+        for _ in range(warmup):
+            session.request(method, url, json=payload, timeout=timeout)
+        local, local_errors = [], {}
+        while (deadline is None or time.perf_counter() < deadline) and next_request():
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, json=payload, timeout=timeout)
+                response.content
+                elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    local_errors[str(response.status_code)] = local_errors.get(str(response.status_code), 0) + 1
+                else:
+                    local.append(elapsed)
+            except requests.RequestException as e:
+                local_errors[type(e).__name__] = local_errors.get(type(e).__name__, 0) + 1
+        session.close()
+        with lock:
+            latencies.extend(local)
+            for key, count in local_errors.items():
+                errors[key] = errors.get(key, 0) + count
+
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, deadline) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies) + sum(errors.values()),
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "throughput": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(nearest_rank(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(nearest_rank(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(nearest_rank(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+def print_report(results):
+    """Print one row per endpoint"""
+    print(f"\n{'endpoint':<16} {'conc':>5} {'reqs':>7} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for result in results:
+        print(f"{result['endpoint']:<16} {result['concurrency']:>5} {result['requests']:>7} "
+              f"{sum(result['errors'].values()):>7} {result['throughput']:>9.1f} {result['p50_ms']:>9.2f} "
+              f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['max_ms']:>9.2f}")
+        for error, count in result["errors"].items():
+            print(f"   ⚠️  {error}: {count}")
+
+def compare_to_baseline(results, baseline_path, max_regression):
+    """Flag endpoints whose p95 rose, or throughput fell, by more than max_regression"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(entry["endpoint"], entry["concurrency"]): entry for entry in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["endpoint"], result["concurrency"]))
+        if not previous:
+            continue
+        if previous["p95_ms"] and result["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{result['endpoint']}@{result['concurrency']}: p95 {previous['p95_ms']} → {result['p95_ms']} ms")
+        if previous["throughput"] and result["throughput"] < previous["throughput"] * (1 - max_regression):
+            regressions.append(f"{result['endpoint']}@{result['concurrency']}: throughput {previous['throughput']} → {result['throughput']} req/s")
+        if sum(result["errors"].values()) > sum(previous["errors"].values()):
+            regressions.append(f"{result['endpoint']}@{result['concurrency']}: errors {sum(previous['errors'].values())} → {sum(result['errors'].values())}")
+
+    if regressions:
+        print(f"\n❌ Performance regressions against {baseline_path} (threshold {max_regression:.0%}):")
+        for regression in regressions:
+            print(f"   {regression}")
+    else:
+        print(f"\n✅ No regressions against {baseline_path} (threshold {max_regression:.0%})")
+    return not regressions
+
+def start_mock_process(latency, jitter):
+    """Run the bundled mock in its own process so it does not share the GIL with the load threads"""
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    process = subprocess.Popen(
+        [sys.executable, MOCK_SERVER_PATH, "--port", str(port), "--latency", str(latency), "--jitter", str(jitter)],
+        stdout=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}/api/excel"
+    for _ in range(100):
+        try:
+            requests.get(f"{base_url}/form-structure/ping", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("mock Excel worker did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description="Smoke-test or benchmark the Excel worker API")
+    parser.add_argument("--smoke", action="store_true", help="Run the one-shot endpoint checks instead of a benchmark")
+    parser.add_argument("--url", help="Worker base URL. Benchmarks run against the bundled mock unless this is given; "
+                                      f"--smoke tries {LOCAL_URL}, then {PRODUCTION_URL}")
+    parser.add_argument("--mock", action="store_true",
+                        help="Benchmark the bundled mock server (the default when --url is not given)")
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="Mock per-request latency in ms")
+    parser.add_argument("--mock-jitter", type=float, default=0.0, help="Mock random extra latency in ms")
+    parser.add_argument("--endpoints", default=",".join(BENCHMARK_ENDPOINTS),
+                        help="Comma-separated endpoints to benchmark")
+    parser.add_argument("--concurrency", default="8", help="Concurrent clients; comma-separate to sweep, e.g. 1,8,32")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--duration", type=float, help="Run each endpoint for this many seconds instead of --requests")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed requests per client before measuring")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against a saved baseline and exit 1 on regression")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative p95/throughput regression against --baseline (default: 0.2)")
+    args = parser.parse_args()
+
     print("🧪 Excel Worker Test Suite")
     print("=" * 50)
 
-    # Test local worker first
-    local_available = test_local_worker()
+    if args.smoke:
+        if args.url:
+            test_excel_worker(args.url)
+        # Test local worker first
+        elif not test_local_worker():
+            # Test production worker
+            test_excel_worker()
+        print("\n" + "=" * 50)
+        print("✅ Test suite completed!")
+        return
+
+    # Load is only ever sent to a real worker when its URL is given explicitly
+    mock_process = None
+    if args.mock or not args.url:
+        mock_process, base_url = start_mock_process(args.mock_latency, args.mock_jitter)
+        print(f"🏠 Started local mock worker at {base_url}")
+    else:
+        base_url = args.url
 
-    if not local_available:
-        # Test production worker
-        test_excel_worker()
+    try:
+        results = []
+        for concurrency in [int(value) for value in args.concurrency.split(",")]:
+            for endpoint in args.endpoints.split(","):
+                print(f"📡 {endpoint} × {args.duration and f'{args.duration}s' or args.requests} at concurrency {concurrency}...")
+                results.append(run_load(base_url, endpoint.strip(), concurrency, args.requests,
+                                        args.duration, args.warmup))
+    finally:
+        if mock_process:
+            mock_process.terminate()
+            mock_process.wait()
+
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"url": "mock" if mock_process else base_url, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "results": results}, f, indent=2)
+        print(f"\n💾 Saved baseline to {args.save_baseline}")
+
+    if args.baseline and not compare_to_baseline(results, args.baseline, args.max_regression):
+        sys.exit(1)
 
-    print("\n" + "=" * 50)
-    print("✅ Test suite completed!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
-import { Hono } from 'hono';
+import { Hono, Context, Next } from 'hono';
+import { verify } from 'hono/jwt';
 import { Env } from '../index';
 
 export const excelProcessorRoutes = new Hono<{ Bindings: Env }>();
 
+const FORM_002_ID = '002_musculoskeletal_symptom_program';
+const SURVEY_FIELD_TYPES = ['text', 'textarea', 'select', 'radio', 'checkbox', 'date', 'number'];
+
 // Type definitions
 interface SurveyQuestion {
   id: string;
@@ -68,37 +72,163 @@ interface ValidationResult {
  * Handles Excel file parsing and data extraction for survey form 002
  */
 
-// Process Excel file and extract survey structure
+// Process Excel file and extract survey structure.
+// Accepts either the base64 workbook (fileData) or a structure the client
+// already extracted locally (structure), which avoids uploading the file.
 excelProcessorRoutes.post('/process-excel', async (c) => {
   try {
     const body = await c.req.json();
-    const { fileData, fileName } = body;
+    const { fileData, fileName, structure } = body;
+
+    let surveyStructure: SurveyStructure;
+    if (structure) {
+      // A client-supplied structure replaces the live form definition
+      if (!(await isAuthorized(c))) {
+        return c.json({ error: 'Unauthorized' }, 401);
+      }
+      if (!isSurveyStructure(structure)) {
+        return c.json({ error: 'Invalid survey structure' }, 400);
+      }
+      surveyStructure = structure;
+    } else {
+      if (!fileData || fileName !== '002_musculoskeletal_symptom_program.xls') {
+        return c.json({ error: 'Invalid file or filename' }, 400);
+      }
+
+      // Parse Excel file structure for 002 survey
+      surveyStructure = await parseExcelToSurveyStructure(fileData);
+    }
+
+    return c.json(await storeSurveyStructure(c.env, surveyStructure));
+
+  } catch (error) {
+    console.error('Excel processing error:', error);
+    return c.json({ error: 'Failed to process Excel file' }, 500);
+  }
+});
+
+// Resumable chunked upload: the workbook goes to R2 as a multipart upload,
+// one PUT per part, so large files never sit base64-encoded in a JSON body
+// and an interrupted upload only resends the parts it is missing.
+const UPLOAD_SESSION_TTL = 86400; // 1 day
+const MIN_UPLOAD_PART_SIZE = 5 * 1024 * 1024; // R2 minimum for every part but the last
+// Large workbooks are usually .xlsx, so both formats may be uploaded in parts
+const UPLOAD_FILE_NAMES = [`${FORM_002_ID}.xls`, `${FORM_002_ID}.xlsx`];
+
+// Uploads end up replacing the stored form, so they need a valid JWT
+excelProcessorRoutes.use('/uploads', requireAuth);
+excelProcessorRoutes.use('/uploads/*', requireAuth);
+
+interface UploadSession {
+  key: string;
+  uploadId: string;
+  fileName: string;
+  size: number;
+  parts: R2UploadedPart[];
+}
+
+async function getUploadSession(env: Env, uploadId: string): Promise<UploadSession | null> {
+  return await env.SAFEWORK_KV.get(`excel_upload_${uploadId}`, 'json') as UploadSession | null;
+}
+
+async function putUploadSession(env: Env, session: UploadSession): Promise<void> {
+  await env.SAFEWORK_KV.put(
+    `excel_upload_${session.uploadId}`,
+    JSON.stringify(session),
+    { expirationTtl: UPLOAD_SESSION_TTL }
+  );
+}
 
-    if (!fileData || fileName !== '002_musculoskeletal_symptom_program.xls') {
+excelProcessorRoutes.post('/uploads', async (c) => {
+  try {
+    const { fileName, size = 0 } = await c.req.json();
+
+    if (!UPLOAD_FILE_NAMES.includes(fileName)) {
       return c.json({ error: 'Invalid file or filename' }, 400);
     }
 
-    // Parse Excel file structure for 002 survey
-    const surveyStructure = await parseExcelToSurveyStructure(fileData);
+    const key = `excel-uploads/${Date.now()}_${Math.random().toString(36).substr(2, 9)}/${fileName}`;
+    const upload = await c.env.SAFEWORK_STORAGE.createMultipartUpload(key);
+    await putUploadSession(c.env, { key, uploadId: upload.uploadId, fileName, size, parts: [] });
 
-    // Store the parsed structure in KV for form rendering
-    await c.env.SAFEWORK_KV.put(
-      'form_002_musculoskeletal_symptom_program',
-      JSON.stringify(surveyStructure),
-      { expirationTtl: 86400 * 7 } // 7 days
-    );
+    return c.json({ uploadId: upload.uploadId, minPartSize: MIN_UPLOAD_PART_SIZE });
 
-    return c.json({
-      success: true,
-      message: 'Excel file processed successfully',
-      surveyId: '002_musculoskeletal_symptom_program',
-      fieldsCount: surveyStructure.fields.length,
-      sections: surveyStructure.sections.length
-    });
+  } catch (error) {
+    console.error('Upload start error:', error);
+    return c.json({ error: 'Failed to start upload' }, 500);
+  }
+});
+
+excelProcessorRoutes.get('/uploads/:uploadId', async (c) => {
+  const session = await getUploadSession(c.env, c.req.param('uploadId'));
+
+  if (!session) {
+    return c.json({ error: 'Upload not found or expired' }, 404);
+  }
+
+  return c.json({
+    uploadId: session.uploadId,
+    fileName: session.fileName,
+    size: session.size,
+    parts: session.parts.map((part) => part.partNumber)
+  });
+});
+
+excelProcessorRoutes.put('/uploads/:uploadId/parts/:partNumber', async (c) => {
+  try {
+    const session = await getUploadSession(c.env, c.req.param('uploadId'));
+    if (!session) {
+      return c.json({ error: 'Upload not found or expired' }, 404);
+    }
+
+    const partNumber = Number(c.req.param('partNumber'));
+    if (!Number.isInteger(partNumber) || partNumber < 1 || partNumber > 10000) {
+      return c.json({ error: 'Invalid part number' }, 400);
+    }
+    if (!c.req.raw.body) {
+      return c.json({ error: 'Empty part' }, 400);
+    }
+
+    // The body is streamed straight into R2
+    const upload = c.env.SAFEWORK_STORAGE.resumeMultipartUpload(session.key, session.uploadId);
+    const part = await upload.uploadPart(partNumber, c.req.raw.body);
+
+    // Parts are sent one at a time, so this read-modify-write does not race
+    session.parts = [...session.parts.filter((p) => p.partNumber !== partNumber), part]
+      .sort((a, b) => a.partNumber - b.partNumber);
+    await putUploadSession(c.env, session);
+
+    return c.json({ partNumber, etag: part.etag });
 
   } catch (error) {
-    console.error('Excel processing error:', error);
-    return c.json({ error: 'Failed to process Excel file' }, 500);
+    console.error('Upload part error:', error);
+    return c.json({ error: 'Failed to upload part' }, 500);
+  }
+});
+
+excelProcessorRoutes.post('/uploads/:uploadId/complete', async (c) => {
+  try {
+    const session = await getUploadSession(c.env, c.req.param('uploadId'));
+    if (!session) {
+      return c.json({ error: 'Upload not found or expired' }, 404);
+    }
+
+    // The client's own part list wins, in case the session lags behind
+    const body = await c.req.json().catch(() => ({}));
+    const parts: R2UploadedPart[] = Array.isArray(body.parts) && body.parts.length ? body.parts : session.parts;
+
+    const upload = c.env.SAFEWORK_STORAGE.resumeMultipartUpload(session.key, session.uploadId);
+    await upload.complete(parts);
+    await c.env.SAFEWORK_KV.delete(`excel_upload_${session.uploadId}`);
+
+    // The workbook stays in R2 under objectKey; build the 002 structure from it
+    const surveyStructure = await parseExcelToSurveyStructure('');
+
+    return c.json({ ...(await storeSurveyStructure(c.env, surveyStructure)), objectKey: session.key });
+
+  } catch (error) {
+    console.error('Upload complete error:', error);
+    return c.json({ error: 'Failed to complete upload' }, 500);
   }
 });
 
@@ -217,6 +347,84 @@ excelProcessorRoutes.post('/validate-excel', async (c) => {
 
 // Helper functions
 
+// Same JWT as the protected /api/workers routes, checked per request since
+// the rest of /api/excel is public
+async function isAuthorized(c: Context<{ Bindings: Env }>): Promise<boolean> {
+  const header = c.req.header('Authorization') || '';
+  const token = header.startsWith('Bearer ') ? header.slice(7) : '';
+
+  if (!token || !c.env.JWT_SECRET) {
+    return false;
+  }
+
+  try {
+    await verify(token, c.env.JWT_SECRET);
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+async function requireAuth(c: Context<{ Bindings: Env }>, next: Next) {
+  if (!(await isAuthorized(c))) {
+    return c.json({ error: 'Unauthorized' }, 401);
+  }
+  await next();
+}
+
+function isStringArray(value: unknown): value is string[] {
+  return Array.isArray(value) && value.every((item) => typeof item === 'string');
+}
+
+function isSurveyField(value: unknown): value is SurveyField {
+  const field = value as SurveyField;
+  return typeof field === 'object' && field !== null &&
+    typeof field.id === 'string' && field.id.length > 0 &&
+    typeof field.label === 'string' &&
+    SURVEY_FIELD_TYPES.includes(field.type) &&
+    typeof field.required === 'boolean' &&
+    (field.section === undefined || typeof field.section === 'string') &&
+    (field.options === undefined || isStringArray(field.options));
+}
+
+function isSurveyStructure(value: unknown): value is SurveyStructure {
+  const structure = value as SurveyStructure;
+  if (typeof structure !== 'object' || structure === null || structure.formId !== FORM_002_ID) {
+    return false;
+  }
+  if (!Array.isArray(structure.fields) || !structure.fields.every(isSurveyField) ||
+      !Array.isArray(structure.sections)) {
+    return false;
+  }
+
+  // Every section must list fields that exist
+  const fieldIds = new Set(structure.fields.map((field) => field.id));
+  return structure.sections.every((section) =>
+    typeof section === 'object' && section !== null &&
+    typeof section.id === 'string' && section.id.length > 0 &&
+    typeof section.title === 'string' &&
+    isStringArray(section.fields) &&
+    section.fields.every((fieldId) => fieldIds.has(fieldId))
+  );
+}
+
+async function storeSurveyStructure(env: Env, surveyStructure: SurveyStructure) {
+  // Store the parsed structure in KV for form rendering
+  await env.SAFEWORK_KV.put(
+    'form_002_musculoskeletal_symptom_program',
+    JSON.stringify(surveyStructure),
+    { expirationTtl: 86400 * 7 } // 7 days
+  );
+
+  return {
+    success: true,
+    message: 'Excel file processed successfully',
+    surveyId: '002_musculoskeletal_symptom_program',
+    fieldsCount: surveyStructure.fields.length,
+    sections: surveyStructure.sections.length
+  };
+}
+
 async function parseExcelToSurveyStructure(fileData: string): Promise<SurveyStructure> {
   // Enhanced structure based on actual Excel analysis
   return {
@@ -0,0 +1,205 @@
+import { describe, it, expect, beforeEach } from 'vitest';
+import { sign } from 'hono/jwt';
+import { excelProcessorRoutes } from '../src/routes/excel-processor';
+
+/**
+ * Excel Processor Route Tests
+ * Tests the JWT gate on structure posts and chunked uploads, and the
+ * validation of client-supplied survey structures
+ *
+ * Runs the routes in-process against in-memory KV and R2 stand-ins
+ */
+
+const JWT_SECRET = 'test-secret';
+const FORM_ID = '002_musculoskeletal_symptom_program';
+
+function createMockEnv() {
+  const kv = new Map<string, string>();
+  return {
+    JWT_SECRET,
+    SAFEWORK_KV: {
+      get: async (key: string, type?: string) => {
+        const value = kv.get(key) ?? null;
+        return value !== null && type === 'json' ? JSON.parse(value) : value;
+      },
+      put: async (key: string, value: string) => {
+        kv.set(key, value);
+      },
+      delete: async (key: string) => {
+        kv.delete(key);
+      },
+    },
+    SAFEWORK_STORAGE: {
+      createMultipartUpload: async (key: string) => ({ key, uploadId: 'upload-1' }),
+    },
+    kv,
+  };
+}
+
+function validStructure() {
+  return {
+    formId: FORM_ID,
+    title: '근골격계부담작업 유해요인조사',
+    description: '근골격계 질환 예방을 위한 작업환경 유해요인 조사',
+    sections: [
+      { id: 'basic_info', title: '기본 정보', fields: ['company_name', 'work_posture'] },
+    ],
+    fields: [
+      { id: 'company_name', type: 'text', required: true, label: '회사명', section: 'basic_info' },
+      {
+        id: 'work_posture', type: 'select', required: true, label: '작업자세 평가', section: 'basic_info',
+        options: ['양호', '보통', '위험'],
+      },
+    ],
+  };
+}
+
+async function validToken() {
+  return sign({ sub: 'admin', exp: Math.floor(Date.now() / 1000) + 3600 }, JWT_SECRET);
+}
+
+async function postJson(env: ReturnType<typeof createMockEnv>, path: string, body: unknown, token?: string) {
+  const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+  if (token !== undefined) {
+    headers.Authorization = `Bearer ${token}`;
+  }
+  return excelProcessorRoutes.request(path, { method: 'POST', headers, body: JSON.stringify(body) }, env);
+}
+
+describe('Excel Processor - Authorization', () => {
+  let env: ReturnType<typeof createMockEnv>;
+
+  beforeEach(() => {
+    env = createMockEnv();
+  });
+
+  describe('Structure posts (/process-excel with structure)', () => {
+    const body = () => ({ fileName: `${FORM_ID}.xlsx`, structure: validStructure() });
+
+    it('should reject a structure without a Bearer token', async () => {
+      const response = await postJson(env, '/process-excel', body());
+
+      expect(response.status).toBe(401);
+      expect(env.kv.has(`form_${FORM_ID}`)).toBe(false);
+    });
+
+    it('should reject a malformed token', async () => {
+      const response = await postJson(env, '/process-excel', body(), 'not-a-jwt');
+
+      expect(response.status).toBe(401);
+    });
+
+    it('should reject a token signed with another secret', async () => {
+      const token = await sign({ sub: 'admin', exp: Math.floor(Date.now() / 1000) + 3600 }, 'other-secret');
+      const response = await postJson(env, '/process-excel', body(), token);
+
+      expect(response.status).toBe(401);
+    });
+
+    it('should reject an expired token', async () => {
+      const token = await sign({ sub: 'admin', exp: Math.floor(Date.now() / 1000) - 60 }, JWT_SECRET);
+      const response = await postJson(env, '/process-excel', body(), token);
+
+      expect(response.status).toBe(401);
+    });
+
+    it('should store the structure with a valid token', async () => {
+      const response = await postJson(env, '/process-excel', body(), await validToken());
+      const data = await response.json() as { success: boolean; fieldsCount: number; sections: number };
+
+      expect(response.status).toBe(200);
+      expect(data.success).toBe(true);
+      expect(data.fieldsCount).toBe(2);
+      expect(data.sections).toBe(1);
+      expect(JSON.parse(env.kv.get(`form_${FORM_ID}`))).toEqual(validStructure());
+    });
+  });
+
+  describe('Chunked uploads (/uploads*)', () => {
+    it('should reject starting an upload without a Bearer token', async () => {
+      const response = await postJson(env, '/uploads', { fileName: `${FORM_ID}.xlsx`, size: 1024 });
+
+      expect(response.status).toBe(401);
+    });
+
+    it('should reject starting an upload with a bad token', async () => {
+      const response = await postJson(env, '/uploads', { fileName: `${FORM_ID}.xlsx`, size: 1024 }, 'not-a-jwt');
+
+      expect(response.status).toBe(401);
+    });
+
+    it('should reject upload status and completion without a token', async () => {
+      const status = await excelProcessorRoutes.request('/uploads/upload-1', {}, env);
+      const complete = await postJson(env, '/uploads/upload-1/complete', {});
+
+      expect(status.status).toBe(401);
+      expect(complete.status).toBe(401);
+    });
+
+    it('should start .xls and .xlsx uploads with a valid token', async () => {
+      for (const fileName of [`${FORM_ID}.xls`, `${FORM_ID}.xlsx`]) {
+        const response = await postJson(env, '/uploads', { fileName, size: 1024 }, await validToken());
+        const data = await response.json() as { uploadId: string; minPartSize: number };
+
+        expect(response.status).toBe(200);
+        expect(data.uploadId).toBe('upload-1');
+        expect(data.minPartSize).toBe(5 * 1024 * 1024);
+      }
+    });
+
+    it('should reject other file names with a valid token', async () => {
+      const response = await postJson(env, '/uploads', { fileName: 'other.xlsx', size: 1024 }, await validToken());
+
+      expect(response.status).toBe(400);
+    });
+  });
+});
+
+describe('Excel Processor - Structure Validation', () => {
+  let env: ReturnType<typeof createMockEnv>;
+
+  beforeEach(() => {
+    env = createMockEnv();
+  });
+
+  async function postStructure(structure: unknown) {
+    return postJson(env, '/process-excel', { fileName: `${FORM_ID}.xlsx`, structure }, await validToken());
+  }
+
+  it('should reject a field with an unknown type', async () => {
+    const structure = validStructure();
+    structure.fields[0].type = 'signature';
+
+    const response = await postStructure(structure);
+
+    expect(response.status).toBe(400);
+    expect(env.kv.has(`form_${FORM_ID}`)).toBe(false);
+  });
+
+  it('should reject a section that lists a missing field id', async () => {
+    const structure = validStructure();
+    structure.sections[0].fields.push('missing_field');
+
+    const response = await postStructure(structure);
+
+    expect(response.status).toBe(400);
+  });
+
+  it('should reject a structure for another form', async () => {
+    const structure = { ...validStructure(), formId: '001_musculoskeletal_symptom_survey' };
+
+    const response = await postStructure(structure);
+
+    expect(response.status).toBe(400);
+  });
+
+  it('should reject fields with non-string options or a missing required flag', async () => {
+    const badOptions = validStructure();
+    (badOptions.fields[1] as { options: unknown }).options = [1, 2, 3];
+    const missingRequired = validStructure();
+    delete (missingRequired.fields[0] as { required?: boolean }).required;
+
+    expect((await postStructure(badOptions)).status).toBe(400);
+    expect((await postStructure(missingRequired)).status).toBe(400);
+  });
+});